@@ -0,0 +1,203 @@
+# asset_store.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import requests
+
+STORE_DIR = os.environ.get("GAME_MAKER_STORE", "asset_store")
+REF_PREFIX = "asset:sha256:"
+REF_PATTERN = re.compile(r"asset:sha256:[0-9a-f]{64}")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    hash TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    media_type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    url TEXT PRIMARY KEY,
+    hash TEXT NOT NULL REFERENCES assets(hash)
+);
+CREATE TABLE IF NOT EXISTS names (
+    name TEXT PRIMARY KEY,
+    hash TEXT NOT NULL REFERENCES assets(hash)
+);
+CREATE TABLE IF NOT EXISTS metadata (
+    hash TEXT NOT NULL REFERENCES assets(hash),
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (hash, key)
+);
+CREATE INDEX IF NOT EXISTS assets_kind ON assets(kind);
+"""
+
+QUERY_CHUNK = 500
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def is_ref(value):
+    """True for strings produced by AssetStore.put_*: the prefix and exactly 64 lowercase hex digits."""
+    return isinstance(value, str) and REF_PATTERN.fullmatch(value) is not None
+
+def ref_hash(ref):
+    # Refs can come from query parameters and stored JSON, so never let one name a path outside the store
+    if not is_ref(ref):
+        raise ValueError(f"Not an asset reference: {ref!r}")
+    return ref[len(REF_PREFIX):]
+
+class AssetStore:
+    """Content-addressed blob store with a SQLite index.
+
+    Blobs are written once under blobs/<first two hex digits>/<sha256>, so identical
+    assets produced by different sessions are stored a single time. Callers keep
+    only the returned reference strings.
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.db_path = os.path.join(root, "index.sqlite3")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        # One short-lived connection per operation keeps the store safe across Streamlit threads
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def path(self, ref):
+        digest = ref_hash(ref)
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def exists(self, ref):
+        return is_ref(ref) and os.path.exists(self.path(ref))
+
+    def put_bytes(self, data, kind, media_type="application/octet-stream"):
+        digest = hashlib.sha256(data).hexdigest()
+        ref = REF_PREFIX + digest
+        blob_path = self.path(ref)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            temp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as blob_file:
+                blob_file.write(data)
+            os.replace(temp_path, blob_path)
+
+        now = time.time()
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT INTO assets (hash, kind, media_type, size, created_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(hash) DO UPDATE SET last_used_at = excluded.last_used_at",
+                (digest, kind, media_type, len(data), now, now)
+            )
+        return ref
+
+    def put_text(self, text, kind):
+        return self.put_bytes(text.encode("utf-8"), kind, "text/plain; charset=utf-8")
+
+    def put_json(self, value, kind):
+        encoded = json.dumps(value, sort_keys=True).encode("utf-8")
+        return self.put_bytes(encoded, kind, "application/json")
+
+    def put_url(self, url, kind, media_type="application/octet-stream"):
+        """Download a URL into the store; URLs already downloaded are not fetched again."""
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT hash FROM sources WHERE url = ?", (url,)).fetchone()
+        if row and self.exists(REF_PREFIX + row[0]):
+            return REF_PREFIX + row[0]
+
+        try:
+            response = requests.get(url)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            return f"Error: Unable to download asset: {str(e)}"
+
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+        ref = self.put_bytes(response.content, kind, content_type or media_type)
+        with closing(self._connect()) as connection, connection:
+            connection.execute("INSERT OR REPLACE INTO sources (url, hash) VALUES (?, ?)", (url, ref_hash(ref)))
+        return ref
+
+    def get_bytes(self, ref):
+        with open(self.path(ref), "rb") as blob_file:
+            return blob_file.read()
+
+    def get_text(self, ref):
+        return self.get_bytes(ref).decode("utf-8")
+
+    def get_json(self, ref):
+        return json.loads(self.get_bytes(ref))
+
+    def set_name(self, name, ref):
+        """Point a stable name (e.g. a derived export) at a stored asset."""
+        with closing(self._connect()) as connection, connection:
+            connection.execute("INSERT OR REPLACE INTO names (name, hash) VALUES (?, ?)", (name, ref_hash(ref)))
+
+    def get_name(self, name):
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT hash FROM names WHERE name = ?", (name,)).fetchone()
+        if row is None or not self.exists(REF_PREFIX + row[0]):
+            return None
+        return REF_PREFIX + row[0]
+
+    def set_metadata(self, ref, key, value):
+        """Attach a small derived value (e.g. a perceptual hash) to a stored asset."""
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO metadata (hash, key, value) VALUES (?, ?, ?)", (ref_hash(ref), key, value)
+            )
+
+    def claim(self, ref, key, value="1"):
+        """Set key on ref only if it is not set yet; True for the one caller that set it."""
+        with closing(self._connect()) as connection, connection:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO metadata (hash, key, value) VALUES (?, ?, ?)", (ref_hash(ref), key, value)
+            )
+            return cursor.rowcount == 1
+
+    def get_metadata(self, refs, key):
+        """Return {ref: value} for the refs that have a value stored under key."""
+        refs = list(refs)
+        values = {}
+        with closing(self._connect()) as connection:
+            for start in range(0, len(refs), QUERY_CHUNK):
+                chunk = [ref_hash(ref) for ref in refs[start:start + QUERY_CHUNK]]
+                placeholders = ",".join("?" * len(chunk))
+                rows = connection.execute(
+                    f"SELECT hash, value FROM metadata WHERE key = ? AND hash IN ({placeholders})", [key] + chunk
+                ).fetchall()
+                values.update({REF_PREFIX + digest: value for digest, value in rows})
+        return values
+
+    def list_refs(self, kind):
+        """References of every stored asset of one kind, oldest first."""
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT hash FROM assets WHERE kind = ? ORDER BY created_at", (kind,)).fetchall()
+        return [REF_PREFIX + row[0] for row in rows]
+
+    def info(self, ref):
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT kind, media_type, size, created_at FROM assets WHERE hash = ?", (ref_hash(ref),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"kind": row[0], "media_type": row[1], "size": row[2], "created_at": row[3]}
+
+def get_asset_store(root=STORE_DIR):
+    """Process-wide store shared by every session."""
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = AssetStore(root)
+        return _stores[root]
@@ -0,0 +1,195 @@
+# atlas_packer.py
+from io import BytesIO
+
+from PIL import Image
+
+from worker_pool import map_in_processes, MAX_WORKERS
+
+ATLAS_MAX_SIZE = 2048
+ATLAS_PADDING = 2
+
+def next_power_of_two(value):
+    power = 1
+    while power < value:
+        power *= 2
+    return power
+
+def open_rgba(image):
+    """Convert palette/greyscale images with transparency so the alpha channel can be read."""
+    if image.mode != "RGBA" and ("A" in image.getbands() or "transparency" in image.info):
+        return image.convert("RGBA")
+    return image
+
+def measure_sprite(job):
+    """Trim bounds and packed size of one sprite: job is (name, path, scale, max_edge)."""
+    name, path, scale, max_edge = job
+    with Image.open(path) as image:
+        image = open_rgba(image)
+        source_width, source_height = image.size
+        if "A" in image.getbands():
+            bbox = image.getchannel("A").getbbox()
+        else:
+            bbox = (0, 0, source_width, source_height)
+    if bbox is None:
+        # Fully transparent sprites have nothing to pack
+        return None
+
+    trimmed_width = bbox[2] - bbox[0]
+    trimmed_height = bbox[3] - bbox[1]
+    # Sprites that cannot fit an atlas at the requested scale are shrunk until they do
+    sprite_scale = min(scale, max_edge / trimmed_width, max_edge / trimmed_height)
+    return {
+        "name": name,
+        "path": path,
+        "bbox": bbox,
+        "scale": sprite_scale,
+        "source_size": (source_width, source_height),
+        "width": max(1, round(trimmed_width * sprite_scale)),
+        "height": max(1, round(trimmed_height * sprite_scale))
+    }
+
+class MaxRectsBin:
+    """MaxRects bin packer using the best-short-side-fit heuristic, without rotation."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.free_rects = [(0, 0, width, height)]
+
+    def insert(self, width, height):
+        best_score = None
+        best_rect = None
+        for free_x, free_y, free_width, free_height in self.free_rects:
+            if width <= free_width and height <= free_height:
+                leftover_x = free_width - width
+                leftover_y = free_height - height
+                score = (min(leftover_x, leftover_y), max(leftover_x, leftover_y))
+                if best_score is None or score < best_score:
+                    best_score = score
+                    best_rect = (free_x, free_y, width, height)
+        if best_rect is not None:
+            self._place(best_rect)
+        return best_rect
+
+    def _place(self, rect):
+        x, y, width, height = rect
+        split = []
+        for free in self.free_rects:
+            free_x, free_y, free_width, free_height = free
+            if x >= free_x + free_width or x + width <= free_x or y >= free_y + free_height or y + height <= free_y:
+                split.append(free)
+                continue
+            if x > free_x:
+                split.append((free_x, free_y, x - free_x, free_height))
+            if x + width < free_x + free_width:
+                split.append((x + width, free_y, free_x + free_width - x - width, free_height))
+            if y > free_y:
+                split.append((free_x, free_y, free_width, y - free_y))
+            if y + height < free_y + free_height:
+                split.append((free_x, y + height, free_width, free_y + free_height - y - height))
+
+        # Drop free rectangles contained in another one
+        self.free_rects = []
+        for index, rect_a in enumerate(split):
+            contained = False
+            for other, rect_b in enumerate(split):
+                if index == other:
+                    continue
+                if (rect_b[0] <= rect_a[0] and rect_b[1] <= rect_a[1]
+                        and rect_a[0] + rect_a[2] <= rect_b[0] + rect_b[2]
+                        and rect_a[1] + rect_a[3] <= rect_b[1] + rect_b[3]
+                        and (rect_a != rect_b or other < index)):
+                    contained = True
+                    break
+            if not contained:
+                self.free_rects.append(rect_a)
+
+def pack_sprites(sprites, max_size=ATLAS_MAX_SIZE, padding=ATLAS_PADDING):
+    """Assign each measured sprite a position in one of as few atlases as possible."""
+    bins = []
+    atlases = []
+    for sprite in sorted(sprites, key=lambda sprite: (max(sprite["width"], sprite["height"]), sprite["width"] * sprite["height"]), reverse=True):
+        padded_width = min(sprite["width"] + padding, max_size)
+        padded_height = min(sprite["height"] + padding, max_size)
+        for packer, atlas in zip(bins, atlases):
+            rect = packer.insert(padded_width, padded_height)
+            if rect:
+                break
+        else:
+            packer = MaxRectsBin(max_size, max_size)
+            atlas = {"sprites": []}
+            bins.append(packer)
+            atlases.append(atlas)
+            rect = packer.insert(padded_width, padded_height)
+        atlas["sprites"].append(dict(sprite, x=rect[0], y=rect[1]))
+
+    # Shrink each atlas to the smallest power-of-two size covering its sprites
+    for atlas in atlases:
+        used_width = max(sprite["x"] + sprite["width"] for sprite in atlas["sprites"])
+        used_height = max(sprite["y"] + sprite["height"] for sprite in atlas["sprites"])
+        atlas["size"] = (next_power_of_two(used_width), next_power_of_two(used_height))
+    return atlases
+
+def render_atlas(atlas):
+    """Compose one atlas and return it as PNG bytes."""
+    canvas = Image.new("RGBA", atlas["size"], (0, 0, 0, 0))
+    for sprite in atlas["sprites"]:
+        with Image.open(sprite["path"]) as image:
+            image = open_rgba(image).convert("RGBA").crop(sprite["bbox"])
+            if image.size != (sprite["width"], sprite["height"]):
+                image = image.resize((sprite["width"], sprite["height"]), Image.Resampling.LANCZOS)
+            canvas.paste(image, (sprite["x"], sprite["y"]))
+    buffer = BytesIO()
+    canvas.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def atlas_metadata(atlas, image_file):
+    """Sprite-sheet description in the TexturePacker JSON (hash) layout, plus Unity's bottom-left rects."""
+    atlas_width, atlas_height = atlas["size"]
+    frames = {}
+    for sprite in atlas["sprites"]:
+        left, top, right, bottom = sprite["bbox"]
+        source_width, source_height = sprite["source_size"]
+        scale = sprite["scale"]
+        frames[sprite["name"]] = {
+            "frame": {"x": sprite["x"], "y": sprite["y"], "w": sprite["width"], "h": sprite["height"]},
+            "rotated": False,
+            "trimmed": (left, top, right, bottom) != (0, 0, source_width, source_height),
+            "spriteSourceSize": {"x": round(left * scale), "y": round(top * scale), "w": sprite["width"], "h": sprite["height"]},
+            "sourceSize": {"w": round(source_width * scale), "h": round(source_height * scale)},
+            "pivot": {"x": 0.5, "y": 0.5},
+            "unityRect": {
+                "x": sprite["x"],
+                "y": atlas_height - sprite["y"] - sprite["height"],
+                "width": sprite["width"],
+                "height": sprite["height"]
+            }
+        }
+    return {
+        "frames": frames,
+        "meta": {
+            "image": image_file,
+            "format": "RGBA8888",
+            "size": {"w": atlas_width, "h": atlas_height}
+        }
+    }
+
+def build_atlases(sprite_paths, atlas_name, max_size=ATLAS_MAX_SIZE, padding=ATLAS_PADDING, scale=1.0, max_workers=MAX_WORKERS):
+    """Pack {sprite_name: image_path} into atlases.
+
+    Returns a list of (image_file, png_bytes, metadata) tuples, one per atlas.
+    Trimming and atlas rendering run in a process pool; the packing itself is
+    cheap and runs in the calling process.
+    """
+    jobs = [(name, path, scale, max_size - padding) for name, path in sprite_paths.items()]
+    sprites = [sprite for sprite in map_in_processes(measure_sprite, jobs, max_workers) if sprite]
+    if not sprites:
+        return []
+
+    atlases = pack_sprites(sprites, max_size, padding)
+    images = map_in_processes(render_atlas, atlases, max_workers)
+    results = []
+    for index, (atlas, png_bytes) in enumerate(zip(atlases, images)):
+        image_file = f"{atlas_name}_{index + 1}.png"
+        results.append((image_file, png_bytes, atlas_metadata(atlas, image_file)))
+    return results
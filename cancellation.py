@@ -0,0 +1,163 @@
+# cancellation.py
+import socket
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POLL_INTERVAL = 0.1
+CALL_WORKERS = 32
+# How long a cancelled run waits for its aborted call to notice its socket is gone
+ABORT_WAIT = 1.0
+
+_executor = ThreadPoolExecutor(max_workers=CALL_WORKERS, thread_name_prefix="provider-call")
+_metrics_lock = threading.Lock()
+_metrics = {'cancelled_runs': 0, 'aborted_calls': 0, 'abandoned_calls': 0, 'skipped_calls': 0}
+
+class CancelledError(Exception):
+    """Raised inside a run whose token was cancelled."""
+
+def count_metric(name, amount=1):
+    with _metrics_lock:
+        _metrics[name] += amount
+
+def cancellation_metrics():
+    """Process-wide counts of cancelled runs and of their calls.
+
+    aborted_calls were in flight and stopped when their connection was shut down,
+    abandoned_calls were still running afterwards (e.g. not made through the token's
+    session) and may still spend provider quota, skipped_calls never started.
+    """
+    with _metrics_lock:
+        return dict(_metrics)
+
+def shutdown_socket(connection):
+    if connection.sock is not None:
+        try:
+            connection.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+class AbortableAdapter(HTTPAdapter):
+    """HTTPAdapter whose open connections abort() can shut down in the middle of a request."""
+
+    def __init__(self, *args, **kwargs):
+        self.aborted = False
+        self.connections = weakref.WeakSet()
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        pool_classes = self.poolmanager.pool_classes_by_scheme
+        self.poolmanager.pool_classes_by_scheme = {scheme: partial(self._new_pool, pool_class) for scheme, pool_class in pool_classes.items()}
+
+    def _new_pool(self, pool_class, *args, **kwargs):
+        pool = pool_class(*args, **kwargs)
+        new_conn = pool._new_conn
+        pool._new_conn = lambda: self._track(new_conn())
+        return pool
+
+    def _track(self, connection):
+        connect = connection.connect
+
+        def tracked_connect():
+            connect()
+            # A connection that finished connecting after abort() is shut down too
+            if self.aborted:
+                shutdown_socket(connection)
+
+        connection.connect = tracked_connect
+        self.connections.add(connection)
+        return connection
+
+    def abort(self):
+        self.aborted = True
+        for connection in list(self.connections):
+            shutdown_socket(connection)
+        self.close()
+
+class CancellationToken:
+    """Cooperative cancellation for one generation run.
+
+    Provider calls made through run() execute on a helper thread while the caller
+    waits on the token, so a cancelled run stops waiting immediately instead of
+    blocking until the HTTP response arrives. HTTP requests made through the
+    token's session are aborted on cancel(): their sockets are shut down, so the
+    helper thread fails at once and gives its scheduler slot back.
+    While waiting, heartbeat() is called every POLL_INTERVAL seconds. In Streamlit
+    a heartbeat that touches an element raises the script's rerun/stop exception
+    as soon as the user reruns the app, which cancels the token.
+    """
+
+    def __init__(self, heartbeat=None):
+        self.heartbeat = heartbeat
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._session = None
+        self._adapter = None
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    @property
+    def session(self):
+        """requests.Session for this run's HTTP calls; cancel() tears its connections down."""
+        with self._lock:
+            if self._session is None:
+                self._adapter = AbortableAdapter()
+                self._session = requests.Session()
+                self._session.mount("http://", self._adapter)
+                self._session.mount("https://", self._adapter)
+                if self.cancelled:
+                    self._adapter.abort()
+            return self._session
+
+    def cancel(self):
+        if not self._event.is_set():
+            self._event.set()
+            count_metric('cancelled_runs')
+            with self._lock:
+                if self._adapter is not None:
+                    self._adapter.abort()
+
+    def check(self):
+        """Raise CancelledError before starting work for a cancelled run."""
+        if self.cancelled:
+            count_metric('skipped_calls')
+            raise CancelledError()
+
+    def run(self, function, *args, **kwargs):
+        self.check()
+        future = _executor.submit(function, *args, **kwargs)
+        try:
+            while not wait([future], timeout=POLL_INTERVAL)[0]:
+                if self.cancelled:
+                    raise CancelledError()
+                if self.heartbeat is not None:
+                    self.heartbeat()
+        except BaseException:
+            # Rerun/stop exceptions from the heartbeat are BaseExceptions, so cancel on anything
+            skipped = future.cancel()
+            # A call that already failed may have been stopped by a concurrent cancel()
+            in_flight = not skipped and not (future.done() and future.exception() is None)
+            self.cancel()
+            if skipped:
+                count_metric('skipped_calls')
+            elif in_flight:
+                count_metric('aborted_calls' if wait([future], timeout=ABORT_WAIT)[0] else 'abandoned_calls')
+            raise
+        if self.cancelled and future.exception() is not None:
+            # The call failed because cancel() shut its connection down
+            count_metric('aborted_calls')
+            raise CancelledError()
+        return future.result()
+
+def call(token, function, *args, **kwargs):
+    """Call function directly, or through the token when one is given."""
+    if token is None:
+        return function(*args, **kwargs)
+    return token.run(function, *args, **kwargs)
@@ -0,0 +1,134 @@
+# gallery.py
+"""Lazy, paginated views of generated assets.
+
+    python gallery.py --counts 10,100,500
+"""
+import argparse
+import math
+import mimetypes
+import tempfile
+import time
+from functools import partial
+
+import streamlit as st
+
+from asset_store import is_ref
+from thumbnails import ensure_thumbnails
+
+GALLERY_PAGE_SIZE = 12
+GALLERY_COLUMNS = 4
+SCRIPT_PAGE_SIZE = 5
+
+def page_items(items, key, page_size):
+    """The slice of items on the page selected by a page picker, shown only when there is more than one page."""
+    page_count = math.ceil(len(items) / page_size)
+    if page_count <= 1:
+        return items
+    # The result set may have shrunk since the page was picked
+    if st.session_state.get(f"{key}_page", 1) > page_count:
+        st.session_state[f"{key}_page"] = page_count
+    # A widget whose value is already in session state must not also get a default
+    default = {} if f"{key}_page" in st.session_state else {'value': 1}
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, key=f"{key}_page", **default)
+    return items[(page - 1) * page_size:page * page_size]
+
+def render_image_gallery(store, images, key, page_size=GALLERY_PAGE_SIZE, columns=GALLERY_COLUMNS):
+    """Render {name: image_ref} as a paginated thumbnail grid.
+
+    Only the current page's thumbnails are created and loaded; full-resolution
+    originals are read from the store when a download button is clicked.
+    """
+    items = list(images.items())
+    if not items:
+        return
+    items = page_items(items, key, page_size)
+
+    media_types = {ref: store.info(ref)['media_type'] for _, ref in items if is_ref(ref)}
+    thumbnails = ensure_thumbnails(store, [ref for ref, media_type in media_types.items() if media_type.startswith('image/')])
+
+    grid = st.columns(columns)
+    for position, (name, ref) in enumerate(items):
+        with grid[position % columns]:
+            if not is_ref(ref):
+                st.caption(f"{name}: {ref}")
+                continue
+            if ref in thumbnails:
+                st.image(store.path(thumbnails[ref]), caption=name)
+            else:
+                st.caption(name)
+            st.download_button(
+                "Download",
+                data=partial(store.get_bytes, ref),
+                file_name=name + (mimetypes.guess_extension(media_types[ref]) or ''),
+                key=f"{key}_download_{name}"
+            )
+
+def render_script_list(store, scripts, key, page_size=SCRIPT_PAGE_SIZE):
+    """Render {file_name: script_ref} as a paginated list of collapsed code blocks.
+
+    Only the current page's scripts are read from the store.
+    """
+    items = list(scripts.items())
+    if not items:
+        return
+    for name, ref in page_items(items, key, page_size):
+        if not is_ref(ref):
+            st.caption(f"{name}: {ref}")
+            continue
+        with st.expander(name):
+            st.code(store.get_text(ref), language='csharp')
+            st.download_button("Download", data=partial(store.get_bytes, ref), file_name=name, key=f"{key}_download_{name}")
+
+def benchmark_app(store_root, count, paginate):
+    """AppTest script: the images and scripts sections of a plan with count assets of each kind."""
+    import streamlit as st
+
+    from asset_store import AssetStore
+    from gallery import render_image_gallery, render_script_list
+
+    store = AssetStore(store_root)
+    images = dict(zip((f"image_{i}" for i in range(count)), store.list_refs('image')[:count]))
+    scripts = dict(zip((f"Script{i}.cs" for i in range(count)), store.list_refs('script')[:count]))
+    page_sizes = {} if paginate else {'page_size': count}
+    with st.expander(f"Images ({len(images)})"):
+        render_image_gallery(store, images, key="images", **page_sizes)
+    with st.expander(f"Scripts ({len(scripts)})"):
+        render_script_list(store, scripts, key="scripts", **page_sizes)
+
+def benchmark(counts, reruns=5):
+    """Median rerun time with paginated sections versus every asset on one page."""
+    from io import BytesIO
+
+    from PIL import Image
+    from streamlit.testing.v1 import AppTest
+
+    from asset_store import AssetStore
+
+    store_root = tempfile.mkdtemp(prefix="gallery-benchmark-")
+    store = AssetStore(store_root)
+    for i in range(max(counts)):
+        buffer = BytesIO()
+        Image.new('RGB', (1024, 1024), (i % 256, (i * 7) % 256, (i * 13) % 256)).save(buffer, format='PNG')
+        store.put_bytes(buffer.getvalue(), 'image', 'image/png')
+        store.put_text(f"public class Script{i} : MonoBehaviour\n{{\n" + "    void Update() { }\n" * 40 + "}\n", 'script')
+
+    print(f"{'assets':>7} {'paginated (s)':>14} {'single page (s)':>16}")
+    for count in counts:
+        timings = []
+        for paginate in (True, False):
+            app = AppTest.from_function(benchmark_app, args=(store_root, count, paginate), default_timeout=600)
+            app.run()  # first run also creates thumbnails
+            samples = []
+            for _ in range(reruns):
+                start = time.perf_counter()
+                app.run()
+                samples.append(time.perf_counter() - start)
+            timings.append(sorted(samples)[len(samples) // 2])
+        print(f"{count:>7} {timings[0]:>14.3f} {timings[1]:>16.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", default="10,100,500", help="comma-separated asset counts")
+    parser.add_argument("--reruns", type=int, default=5, help="timed reruns per count")
+    args = parser.parse_args()
+    benchmark([int(count) for count in args.counts.split(",")], args.reruns)
@@ -0,0 +1,102 @@
+# generation_manifest.py
+import hashlib
+import json
+
+def content_hash(value):
+    """Stable SHA-256 of any JSON-serializable value."""
+    encoded = json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+def asset_inputs(prompt, model, size=None, upstream=(), **options):
+    """Describe everything that determines a generated asset."""
+    inputs = {
+        "prompt_hash": content_hash(prompt),
+        "model": model,
+        "size": size,
+        "upstream": list(upstream)
+    }
+    inputs.update(options)
+    return inputs
+
+def start_build(previous_plan=None):
+    """Start a build that can reuse outputs recorded in a previous plan's manifest."""
+    previous_plan = previous_plan or {}
+    return {
+        "previous_plan": previous_plan,
+        "previous_manifest": previous_plan.get("manifest", {}),
+        "manifest": {},
+        "generated": 0,
+        "skipped": 0
+    }
+
+def is_usable(value):
+    """Failed generations are returned as "Error: ..." strings and must never be reused."""
+    if value is None:
+        return False
+    if isinstance(value, str) and (not value or value.startswith("Error:")):
+        return False
+    if isinstance(value, dict):
+        return all(is_usable(item) for item in value.values())
+    return True
+
+def previous_output(build, section, key=None):
+    """Output stored in the previous plan, either plan[section] or plan[section][key]."""
+    value = build["previous_plan"].get(section)
+    if key is None:
+        return value
+    return value.get(key) if isinstance(value, dict) else None
+
+def is_fresh(build, key, inputs, previous_value):
+    """True when the previous output was produced from exactly these inputs.
+
+    An output regenerated from them by a later step (its inputs name them in
+    "regenerated_from") counts as well, so the regeneration is kept.
+    """
+    entry = build["previous_manifest"].get(key)
+    if not entry or not is_usable(previous_value):
+        return False
+    input_hash = content_hash(inputs)
+    return entry["input_hash"] == input_hash or entry["inputs"].get("regenerated_from") == input_hash
+
+def was_reused(build, key):
+    """True when this build carried key's entry over from the previous manifest."""
+    previous = build["previous_manifest"].get(key)
+    return previous is not None and build["manifest"].get(key) is previous
+
+def reuse(build, key, calls=1):
+    """Carry a fresh manifest entry over into this build."""
+    build["manifest"][key] = build["previous_manifest"][key]
+    build["skipped"] += calls
+
+def record(build, key, inputs, value, calls=1, **details):
+    """Record a newly generated output; failures stay out of the manifest so they are retried.
+
+    details (e.g. which model wrote each part) are stored with the entry but not hashed.
+    """
+    build["generated"] += calls
+    if is_usable(value):
+        build["manifest"][key] = {
+            "input_hash": content_hash(inputs),
+            "inputs": inputs,
+            "output_hash": content_hash(value),
+            **details
+        }
+
+def count_generated(build, calls=1):
+    """Count provider calls that produced several assets at once."""
+    build["generated"] += calls
+
+def build_asset(build, key, inputs, previous_value, produce, calls=1):
+    """Return the previous output if its inputs are unchanged, otherwise call produce()."""
+    if build is None:
+        return produce()
+    if is_fresh(build, key, inputs, previous_value):
+        reuse(build, key, calls)
+        return previous_value
+    value = produce()
+    record(build, key, inputs, value, calls)
+    return value
+
+def build_summary(build):
+    """Counts reported to the user after a rebuild."""
+    return {"generated": build["generated"], "skipped": build["skipped"]}
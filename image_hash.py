@@ -0,0 +1,132 @@
+# image_hash.py
+import numpy as np
+from PIL import Image
+
+from worker_pool import map_in_processes, MAX_WORKERS
+
+HASH_SIZE = 8
+PHASH_SAMPLE = 32
+DUPLICATE_THRESHOLD = 10
+# A pHash match only counts when the dHashes also agree within this many bits;
+# dHash follows gradients rather than overall structure, so the two rarely collide together
+DHASH_THRESHOLD = 12
+PAIR_CHUNK = 1024
+
+def dct_matrix(size):
+    """Orthonormal DCT-II basis, so a 2D DCT is two matrix products."""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+DCT_32 = dct_matrix(PHASH_SAMPLE)
+
+def pack_bits(bits):
+    """Pack a boolean array of 64 bits into an unsigned 64-bit integer."""
+    return int(np.packbits(bits.ravel()).view(">u8")[0])
+
+def grayscale(image, size):
+    """Greyscale float array of the image resized to size, using Pillow's reduce fast path."""
+    image.draft("L", size)
+    image = image.convert("L")
+    factor = min(image.width // (size[0] * 4), image.height // (size[1] * 4))
+    if factor >= 2:
+        image = image.reduce(factor)
+    return np.asarray(image.resize(size, Image.Resampling.BOX), dtype=np.float32)
+
+def dhash(pixels):
+    """Difference hash of a 9x8 greyscale array: is each pixel brighter than its right neighbour."""
+    return pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+def phash(pixels):
+    """DCT hash of a 32x32 greyscale array: low frequencies compared with their median."""
+    low = (DCT_32 @ pixels @ DCT_32.T)[:HASH_SIZE, :HASH_SIZE]
+    return pack_bits(low > np.median(low.ravel()[1:]))
+
+def hash_image_file(path):
+    """Process-pool worker: (dhash, phash) of an image file, or None if it cannot be read."""
+    try:
+        with Image.open(path) as image:
+            image.load()
+            return (
+                dhash(grayscale(image.copy(), (HASH_SIZE + 1, HASH_SIZE))),
+                phash(grayscale(image, (PHASH_SAMPLE, PHASH_SAMPLE)))
+            )
+    except (OSError, ValueError):
+        return None
+
+def ensure_hashes(store, refs, max_workers=MAX_WORKERS):
+    """Return {ref: (dhash, phash)}, hashing images without stored hashes in worker processes."""
+    refs = list(dict.fromkeys(refs))
+    hashes = {
+        ref: tuple(int(part, 16) for part in value.split(":"))
+        for ref, value in store.get_metadata(refs, "image_hash").items()
+    }
+    missing = [ref for ref in refs if ref not in hashes]
+    results = map_in_processes(hash_image_file, [store.path(ref) for ref in missing], max_workers)
+    for ref, result in zip(missing, results):
+        if result is None:
+            continue
+        store.set_metadata(ref, "image_hash", f"{result[0]:016x}:{result[1]:016x}")
+        hashes[ref] = result
+    return hashes
+
+def popcount(values):
+    """Set bits per element of a uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    # NumPy < 2.0: count bits per byte with a lookup table
+    table = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+    return table[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+def hamming_distances(hashes, others):
+    """Matrix of Hamming distances between two uint64 arrays of hashes."""
+    return popcount(np.bitwise_xor(hashes[:, None], others[None, :]))
+
+def pair_distances(hashes, others, confirm_threshold):
+    """pHash Hamming distances between two (n, 2) arrays of (dhash, phash), 65 where the dHashes disagree."""
+    distances = hamming_distances(hashes[:, 1], others[:, 1]).astype(np.int64)
+    distances[hamming_distances(hashes[:, 0], others[:, 0]) > confirm_threshold] = 65
+    return distances
+
+def find_near_duplicates(hashes, threshold=DUPLICATE_THRESHOLD, known=None, confirm_threshold=DHASH_THRESHOLD):
+    """Flag hashes within threshold pHash bits of an earlier hash or of a known hash.
+
+    hashes and known are (n, 2) uint64 arrays of (dhash, phash) as returned by
+    ensure_hashes. A pair only matches when its dHashes are also within
+    confirm_threshold bits. Returns a list of (index, match, distance), where match is
+    ("known", i) or ("new", i), i indexes the matching array and distance is in pHash bits.
+    Pairs are compared in chunks, so memory stays bounded for thousands of images.
+    """
+    flagged = []
+    hashes = np.asarray(hashes, dtype=np.uint64).reshape(-1, 2)
+    known = np.zeros((0, 2), dtype=np.uint64) if known is None else np.asarray(known, dtype=np.uint64).reshape(-1, 2)
+    count = len(hashes)
+    for start in range(0, count, PAIR_CHUNK):
+        chunk = hashes[start:start + PAIR_CHUNK]
+        best_distance = np.full(len(chunk), 65, dtype=np.int64)
+        best_match = [None] * len(chunk)
+
+        for known_start in range(0, len(known), PAIR_CHUNK):
+            distances = pair_distances(chunk, known[known_start:known_start + PAIR_CHUNK], confirm_threshold)
+            nearest = distances.argmin(axis=1)
+            nearest_distance = distances[np.arange(len(chunk)), nearest]
+            for row in np.nonzero(nearest_distance < best_distance)[0]:
+                best_distance[row] = nearest_distance[row]
+                best_match[row] = ("known", known_start + int(nearest[row]))
+
+        # Only earlier images count, so the first of a group of duplicates is kept
+        earlier = hashes[:start + len(chunk)]
+        distances = pair_distances(chunk, earlier, confirm_threshold)
+        rows, columns = np.indices(distances.shape)
+        distances[columns >= rows + start] = 65
+        nearest = distances.argmin(axis=1)
+        nearest_distance = distances[np.arange(len(chunk)), nearest]
+        for row in np.nonzero(nearest_distance < best_distance)[0]:
+            best_distance[row] = nearest_distance[row]
+            best_match[row] = ("new", int(nearest[row]))
+
+        for row in np.nonzero(best_distance <= threshold)[0]:
+            flagged.append((start + int(row), best_match[row], int(best_distance[row])))
+    return flagged
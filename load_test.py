@@ -0,0 +1,260 @@
+# load_test.py
+"""Load harness for the Streamlit apps.
+
+Drives simulated sessions through the main.py and main3.py flows with Streamlit's
+AppTest, against a local stub of the OpenAI API, at increasing concurrency, and
+reports latency percentiles, error rate, memory per session and the concurrency
+at which the app saturates.
+
+    python load_test.py --app main.py --levels 1,2,4,8,16 --latency 0.05
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import requests
+from PIL import Image, ImageDraw
+
+PROVIDER_PREFIXES = ("https://api.openai.com", "https://api.replicate.com")
+STUB_SCRIPT = "using UnityEngine;\n\npublic class StubBehaviour : MonoBehaviour\n{\n    void Update()\n    {\n    }\n}\n"
+STUB_IMAGE_VARIANTS = 16
+SATURATION_THROUGHPUT_GAIN = 1.1
+SATURATION_LATENCY_FACTOR = 2.0
+SATURATION_ERROR_RATE = 0.01
+
+def stub_images(count=STUB_IMAGE_VARIANTS, size=(256, 256)):
+    """Distinct small PNGs so image deduplication and thumbnails see realistic input."""
+    rng = random.Random(0)
+    images = []
+    for _ in range(count):
+        image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+        box = sorted(rng.sample(range(size[0]), 2)) + sorted(rng.sample(range(size[1]), 2))
+        ImageDraw.Draw(image).ellipse((box[0], box[2], box[1], box[3]), fill=tuple(rng.randrange(256) for _ in range(3)))
+        buffer = BytesIO()
+        image.save(buffer, format="PNG")
+        images.append(buffer.getvalue())
+    return images
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible stub answering chat and image requests after a fixed latency."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.server.latency)
+        self.server.count_request()
+
+        if self.path.endswith("/images/generations"):
+            image_id = random.randrange(len(self.server.images))
+            url = f"http://{self.server.server_address[0]}:{self.server.server_address[1]}/stub-images/{image_id}.png"
+            self.send_json({"data": [{"url": url}]})
+            return
+
+        response_format = request.get("response_format")
+        if response_format:
+            schema = response_format["json_schema"]["schema"]
+            content = {}
+            for name, field in schema["properties"].items():
+                if field.get("type") == "array":
+                    content[name] = [f"Stub {name} {index}: {random.random()}" for index in range(4)]
+                else:
+                    content[name] = f"Stub {name}. " * 10
+            content = json.dumps(content)
+        else:
+            content = STUB_SCRIPT
+        self.send_json({"choices": [{"message": {"content": content}}]})
+
+    def do_GET(self):
+        if not self.path.startswith("/stub-images/"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = self.server.images[int(self.path.rsplit("/", 1)[1].split(".")[0])]
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class StubProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency):
+        super().__init__(("127.0.0.1", 0), StubProviderHandler)
+        self.latency = latency
+        self.images = stub_images()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+def route_providers_to(base_url):
+    """Send every provider request made through requests to the stub server instead."""
+    original_request = requests.sessions.Session.request
+
+    def request(session, method, url, *args, **kwargs):
+        for prefix in PROVIDER_PREFIXES:
+            if url.startswith(prefix):
+                url = base_url + url[len(prefix):]
+        return original_request(session, method, url, *args, **kwargs)
+
+    requests.sessions.Session.request = request
+    return lambda: setattr(requests.sessions.Session, "request", original_request)
+
+def main_flow(app):
+    """main.py: generate a full game plan."""
+    [button for button in app.button if button.label == "Generate Game Plan"][0].click()
+    yield app
+
+def main3_flow(app):
+    """main3.py: generate images, then scripts."""
+    for label in ("Generate Images", "Generate Scripts"):
+        [button for button in app.button if button.label == label][0].click()
+        yield app
+
+FLOWS = {"main.py": main_flow, "main3.py": main3_flow}
+
+def run_session(app_path, timeout):
+    """One simulated user: load the app and walk through its flow.
+
+    Returns (rerun_latencies, flow_latency, error).
+    """
+    from streamlit.testing.v1 import AppTest
+
+    latencies = []
+    start = time.perf_counter()
+    try:
+        app = AppTest.from_file(app_path, default_timeout=timeout)
+        app.session_state["api_keys"] = {"openai": "load-test", "replicate": "load-test"}
+        rerun_start = time.perf_counter()
+        app.run()
+        latencies.append(time.perf_counter() - rerun_start)
+        for app in FLOWS[os.path.basename(app_path)](app):
+            rerun_start = time.perf_counter()
+            app.run()
+            latencies.append(time.perf_counter() - rerun_start)
+            if app.exception:
+                return latencies, time.perf_counter() - start, app.exception[0].value
+    except Exception as e:
+        return latencies, time.perf_counter() - start, repr(e)
+    return latencies, time.perf_counter() - start, None
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def run_level(app_path, concurrency, sessions, timeout):
+    """Run sessions simulated users with at most concurrency at a time."""
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: run_session(app_path, timeout), range(sessions)))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    reruns = [latency for latencies, _, _ in results for latency in latencies]
+    flows = [flow for _, flow, error in results if error is None]
+    errors = [error for _, _, error in results if error is not None]
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "throughput": sessions / elapsed,
+        "rerun_p50": percentile(reruns, 0.5),
+        "rerun_p95": percentile(reruns, 0.95),
+        "rerun_p99": percentile(reruns, 0.99),
+        "flow_p50": percentile(flows, 0.5),
+        "flow_p95": percentile(flows, 0.95),
+        "error_rate": len(errors) / sessions,
+        "errors": sorted(set(errors))[:3],
+        "memory_per_session_mb": (peak - baseline) / concurrency / 1e6
+    }
+
+def saturation_point(results):
+    """First concurrency level where throughput stops scaling, latency blows up or errors appear."""
+    baseline = results[0]
+    for previous, current in zip(results, results[1:]):
+        if current["error_rate"] > SATURATION_ERROR_RATE:
+            return current["concurrency"], "error rate"
+        if current["flow_p95"] > SATURATION_LATENCY_FACTOR * baseline["flow_p95"]:
+            return current["concurrency"], "p95 latency"
+        if current["throughput"] < SATURATION_THROUGHPUT_GAIN * previous["throughput"]:
+            return current["concurrency"], "throughput plateau"
+    return None, None
+
+def print_report(app_path, results, server):
+    print(f"\n{app_path}: {server.requests} provider requests served by the stub")
+    print(f"{'conc':>5} {'sess':>5} {'sess/s':>7} {'rerun p50':>10} {'p95':>7} {'p99':>7} {'flow p50':>9} {'p95':>7} {'errors':>7} {'MB/sess':>8}")
+    for result in results:
+        print(
+            f"{result['concurrency']:>5} {result['sessions']:>5} {result['throughput']:>7.2f} "
+            f"{result['rerun_p50']:>10.3f} {result['rerun_p95']:>7.3f} {result['rerun_p99']:>7.3f} "
+            f"{result['flow_p50']:>9.3f} {result['flow_p95']:>7.3f} {result['error_rate']:>7.1%} "
+            f"{result['memory_per_session_mb']:>8.2f}"
+        )
+        for error in result["errors"]:
+            print(f"      error: {error}")
+    level, reason = saturation_point(results)
+    if level:
+        print(f"Saturation at {level} concurrent sessions ({reason}).")
+    else:
+        print("No saturation within the tested levels.")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", action="append", choices=sorted(FLOWS), help="app to drive (repeatable, default: both)")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="comma-separated concurrency levels")
+    parser.add_argument("--sessions-per-level", type=int, default=2, help="sessions per unit of concurrency")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub provider latency in seconds")
+    parser.add_argument("--timeout", type=float, default=300, help="per-rerun timeout in seconds")
+    args = parser.parse_args()
+
+    # Keep load-test assets out of the real store; must be set before the apps import asset_store
+    os.environ["GAME_MAKER_STORE"] = tempfile.mkdtemp(prefix="game-maker-load-")
+    server = StubProviderServer(args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    restore = route_providers_to(server.base_url)
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        for app in args.app or sorted(FLOWS):
+            app_path = os.path.join(directory, app)
+            # Warm-up session so module imports are not counted as per-session memory or latency
+            run_session(app_path, args.timeout)
+            results = []
+            for concurrency in [int(level) for level in args.levels.split(",")]:
+                results.append(run_level(app_path, concurrency, concurrency * args.sessions_per_level, args.timeout))
+            print_report(app, results, server)
+    finally:
+        restore()
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
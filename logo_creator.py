@@ -1,28 +1,59 @@
 # logo_creator.py
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
 from PIL import Image, ImageDraw, ImageFont
 
-def create_logo(text, font_size=60, output_file='logo.png'):
-    """Create a simple logo with the specified text and save it as an image."""
-    # Create a new image with white background
-    width, height = 800, 300
-    image = Image.new('RGBA', (width, height), 'white')
-    draw = ImageDraw.Draw(image)
+DEFAULT_FONT = "arial.ttf"
+LOGO_SIZE = (800, 300)
+LOGO_WORKERS = 4
 
-    # Define the font and size
+@lru_cache(maxsize=64)
+def load_font(path, size):
+    """Load a TrueType font once per (path, size), falling back to Pillow's default font."""
     try:
-        font = ImageFont.truetype("arial.ttf", font_size)
+        return ImageFont.truetype(path, size)
     except IOError:
-        font = ImageFont.load_default()
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:
+            # Pillow < 10.1 has a single bitmap default font
+            return ImageFont.load_default()
+
+def render_logo(text, font_size=60, fill='black', background='white', size=LOGO_SIZE, font_path=DEFAULT_FONT):
+    """Render a simple text logo centred on its canvas and return it as PNG bytes."""
+    width, height = size
+    image = Image.new('RGBA', (width, height), background)
+    draw = ImageDraw.Draw(image)
+    font = load_font(font_path, font_size)
+
+    # textbbox includes the font's offset from the origin, so centre the box itself
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    position = ((width - (right - left)) // 2 - left, (height - (bottom - top)) // 2 - top)
+    draw.text(position, text, fill=fill, font=font)
+
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
 
-    # Calculate text size and position
-    text_width, text_height = draw.textsize(text, font=font)
-    position = ((width - text_width) // 2, (height - text_height) // 2)
+def render_logos(variants, max_workers=LOGO_WORKERS):
+    """Render many logo variants at once.
 
-    # Draw the text
-    draw.text(position, text, fill='black', font=font)
+    Each variant is a dict of render_logo keyword arguments (text is required).
+    Returns the PNG bytes in the same order. Threads share the font cache, and
+    Pillow releases the GIL while rasterizing and encoding.
+    """
+    variants = list(variants)
+    if len(variants) <= 1:
+        return [render_logo(**variant) for variant in variants]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(variants))) as executor:
+        return list(executor.map(lambda variant: render_logo(**variant), variants))
 
-    # Save the image
-    image.save(output_file)
+def create_logo(text, font_size=60, output_file='logo.png'):
+    """Create a simple logo with the specified text and save it as an image."""
+    with open(output_file, 'wb') as logo_file:
+        logo_file.write(render_logo(text, font_size))
 
 def display_logo(image_path, width=200):
     """Display the logo image using PIL."""
@@ -2,30 +2,98 @@ import streamlit as st
 import requests
 import json
 import os
+import time
+import uuid
 import zipfile
+import mimetypes
+from functools import partial
+import numpy as np
 from io import BytesIO
 from PIL import Image
 import replicate
+from unity_scripts import batch_script_prompt, split_script_batch, validate_script, script_class_name
+from script_templates import SCAFFOLDS, scaffold_prompt, scaffold_schema, fill_scaffold
+from generation_manifest import (
+    content_hash, asset_inputs, start_build, previous_output, is_fresh, was_reused, reuse, record,
+    count_generated, build_asset, build_summary, is_usable
+)
+from asset_store import get_asset_store, is_ref, REF_PREFIX
+from gallery import render_image_gallery, render_script_list
+from atlas_packer import build_atlases
+from background_removal import ensure_cutouts
+from image_hash import ensure_hashes, find_near_duplicates
+from mesh_lod import build_lods_for_models
+from logo_creator import render_logos
+from image_optimizer import QUALITY_PRESETS, optimize_images, summarize
+from random_game_concept import get_random_game_concept
+from plan_index import get_plan_index
+from cancellation import CancellationToken, CancelledError, call, cancellation_metrics
+from scheduler import get_scheduler
 
 # Constants
 CHAT_API_URL = "https://api.openai.com/v1/chat/completions"
 DALLE_API_URL = "https://api.openai.com/v1/images/generations"
 REPLICATE_API_URL = "https://api.replicate.com/v1/predictions"  # Optional
 API_KEY_FILE = "api_key.json"
+# Connect and read timeouts in seconds; a hung provider call must not hold a shared scheduler slot forever
+PROVIDER_TIMEOUT = (10, 180)
+CHAT_MODEL = "gpt-4"
+IMAGE_MODEL = "dall-e-3"
+MUSIC_MODEL = "meta/musicgen:671ac645ce5e552cc63a54a2bbff63fcf798043055d2dac5fc9e36a837eedcfb"
+STRUCTURED_MODEL = "gpt-4o-mini"  # json_schema response_format is not available on gpt-4
+MIN_SECTION_LENGTH = 40
+MAX_REGENERATION_ATTEMPTS = 2
+LOGO_STYLES = {
+    'dark': {'fill': 'black', 'background': 'white'},
+    'light': {'fill': 'white', 'background': 'black'},
+    'transparent': {'fill': 'black', 'background': (0, 0, 0, 0)}
+}
+LOGO_FONT_SIZES = [60, 96]
 
 # Initialize session state
 if 'api_keys' not in st.session_state:
     st.session_state.api_keys = {'openai': None, 'replicate': None}
 
+# Identifies this browser session to the process-wide provider scheduler
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 if 'customization' not in st.session_state:
     st.session_state.customization = {
         'image_types': ['Character', 'Enemy', 'Background', 'Object'],
         'script_types': ['Player', 'Enemy', 'Game Object', 'Level Background'],
         'image_count': {'Character': 1, 'Enemy': 1, 'Background': 1, 'Object': 2},
         'script_count': {'Player': 1, 'Enemy': 1, 'Game Object': 3, 'Level Background': 1},
-        'use_replicate': {'convert_to_3d': False, 'generate_music': False}
+        'use_replicate': {'convert_to_3d': False, 'generate_music': False},
+        'structured_docs': {'enabled': False, 'include_concept': False},
+        'batch_scripts': False,
+        'script_templates': True,
+        'export_atlas': {'enabled': False, 'image_types': ['Object', 'Character', 'Enemy'], 'max_size': 2048, 'scale': 0.5},
+        'remove_background': {'enabled': False, 'tolerance': 30, 'softness': 20, 'feather': 1},
+        'dedupe_images': {'enabled': False, 'threshold': 10, 'regenerate': False, 'across_plans': False},
+        'mesh_lod': {'enabled': False, 'ratios': [0.5, 0.25, 0.1]},
+        'logo_text': '',
+        'optimize_images': {'enabled': False, 'quality': 'balanced', 'webp': False}
     }
 
+# Restore the last plan of this browser tab after a restart
+if 'game_plan_ref' not in st.session_state:
+    plan_ref = f"{REF_PREFIX}{st.query_params.get('plan', '')}"
+    # Only a well-formed reference to a stored plan is accepted from the URL
+    plan_info = get_asset_store().info(plan_ref) if is_ref(plan_ref) else None
+    st.session_state.game_plan_ref = plan_ref if plan_info and plan_info['kind'] == 'plan' else None
+
+# Options added after a session was started
+st.session_state.customization.setdefault('structured_docs', {'enabled': False, 'include_concept': False})
+st.session_state.customization.setdefault('batch_scripts', False)
+st.session_state.customization.setdefault('script_templates', True)
+st.session_state.customization.setdefault('export_atlas', {'enabled': False, 'image_types': ['Object', 'Character', 'Enemy'], 'max_size': 2048, 'scale': 0.5})
+st.session_state.customization.setdefault('remove_background', {'enabled': False, 'tolerance': 30, 'softness': 20, 'feather': 1})
+st.session_state.customization.setdefault('dedupe_images', {'enabled': False, 'threshold': 10, 'regenerate': False, 'across_plans': False})
+st.session_state.customization.setdefault('mesh_lod', {'enabled': False, 'ratios': [0.5, 0.25, 0.1]})
+st.session_state.customization.setdefault('logo_text', '')
+st.session_state.customization.setdefault('optimize_images', {'enabled': False, 'quality': 'balanced', 'webp': False})
+
 # Load API keys from a file
 def load_api_keys():
     if os.path.exists(API_KEY_FILE):
@@ -46,10 +114,20 @@ def get_openai_headers():
         "Content-Type": "application/json"
     }
 
+# requests.post, or the run's own session so cancelling the run aborts the request
+def http_post(token):
+    return token.session.post if token is not None else requests.post
+
+# Make a provider call once this session is granted a slot in the provider's shared quota
+# Interactive calls (design documents) are served ahead of bulk jobs (images, scripts, models, music)
+def provider_call(token, provider, kind, function, *args, **kwargs):
+    is_cancelled = (lambda: token.cancelled) if token is not None else None
+    return call(token, get_scheduler(provider).run, st.session_state.session_id, function, *args, kind=kind, is_cancelled=is_cancelled, **kwargs)
+
 # Generate content using OpenAI API
-def generate_content(prompt, role):
+def generate_content(prompt, role, token=None, kind='interactive'):
     data = {
-        "model": "gpt-4",
+        "model": CHAT_MODEL,
         "messages": [
             {"role": "system", "content": f"You are a helpful assistant specializing in {role}."},
             {"role": "user", "content": prompt}
@@ -57,7 +135,7 @@ def generate_content(prompt, role):
     }
 
     try:
-        response = requests.post(CHAT_API_URL, headers=get_openai_headers(), json=data)
+        response = provider_call(token, 'openai', kind, http_post(token), CHAT_API_URL, headers=get_openai_headers(), json=data, timeout=PROVIDER_TIMEOUT)
         response.raise_for_status()
         response_data = response.json()
         if "choices" not in response_data:
@@ -70,10 +148,42 @@ def generate_content(prompt, role):
     except requests.RequestException as e:
         return f"Error: Unable to communicate with the OpenAI API: {str(e)}"
 
+# Generate a JSON object constrained by a JSON schema using OpenAI's structured outputs
+def generate_structured_content(prompt, role, schema, schema_name, token=None, kind='interactive'):
+    data = {
+        "model": STRUCTURED_MODEL,
+        "messages": [
+            {"role": "system", "content": f"You are a helpful assistant specializing in {role}."},
+            {"role": "user", "content": prompt}
+        ],
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": schema_name, "strict": True, "schema": schema}
+        }
+    }
+
+    try:
+        response = provider_call(token, 'openai', kind, http_post(token), CHAT_API_URL, headers=get_openai_headers(), json=data, timeout=PROVIDER_TIMEOUT)
+        response.raise_for_status()
+        response_data = response.json()
+        if "choices" not in response_data:
+            error_message = response_data.get("error", {}).get("message", "Unknown error")
+            return f"Error: {error_message}"
+
+        message = response_data["choices"][0]["message"]
+        if message.get("refusal"):
+            return f"Error: {message['refusal']}"
+        return json.loads(message["content"])
+
+    except requests.RequestException as e:
+        return f"Error: Unable to communicate with the OpenAI API: {str(e)}"
+    except (json.JSONDecodeError, TypeError) as e:
+        return f"Error: Invalid structured response: {str(e)}"
+
 # Generate images using OpenAI's DALL-E API
-def generate_image(prompt, size):
+def generate_image(prompt, size, token=None):
     data = {
-        "model": "dall-e-3",
+        "model": IMAGE_MODEL,
         "prompt": prompt,
         "size": size,
         "n": 1,
@@ -81,7 +191,7 @@ def generate_image(prompt, size):
     }
 
     try:
-        response = requests.post(DALLE_API_URL, headers=get_openai_headers(), json=data)
+        response = provider_call(token, 'openai', 'bulk', http_post(token), DALLE_API_URL, headers=get_openai_headers(), json=data, timeout=PROVIDER_TIMEOUT)
         response.raise_for_status()
         response_data = response.json()
         if "data" not in response_data:
@@ -98,7 +208,7 @@ def generate_image(prompt, size):
         return f"Error: Unable to generate image: {str(e)}"
 
 # Convert image to 3D model using Replicate API
-def convert_image_to_3d(image_url):
+def convert_image_to_3d(image_url, token=None):
     headers = {
         "Authorization": f"Token {st.session_state.api_keys['replicate']}",
         "Content-Type": "application/json"
@@ -109,7 +219,7 @@ def convert_image_to_3d(image_url):
     }
 
     try:
-        response = requests.post("https://api.replicate.com/v1/predictions", headers=headers, json=data)
+        response = provider_call(token, 'replicate', 'bulk', http_post(token), "https://api.replicate.com/v1/predictions", headers=headers, json=data, timeout=PROVIDER_TIMEOUT)
         response.raise_for_status()
         response_data = response.json()
         return response_data.get('output', {}).get('url')
@@ -117,8 +227,8 @@ def convert_image_to_3d(image_url):
         return f"Error: Unable to convert image to 3D model: {str(e)}"
 
 # Generate music using Replicate's MusicGen
-def generate_music(prompt):
-    replicate_client = replicate.Client(api_token=st.session_state.api_keys['replicate'])
+def generate_music(prompt, token=None):
+    replicate_client = replicate.Client(api_token=st.session_state.api_keys['replicate'], timeout=PROVIDER_TIMEOUT[1])
     
     try:
         input_data = {
@@ -128,49 +238,133 @@ def generate_music(prompt):
             "normalization_strategy": "peak"
         }
         
-        output = replicate_client.run(
-            "meta/musicgen:671ac645ce5e552cc63a54a2bbff63fcf798043055d2dac5fc9e36a837eedcfb",
+        output = provider_call(
+            token,
+            'replicate',
+            'bulk',
+            replicate_client.run,
+            MUSIC_MODEL,
             input=input_data
         )
         
         return output
     
+    except CancelledError:
+        raise
     except Exception as e:
         return f"Error: Unable to generate music: {str(e)}"
         
+# Base image prompts
+IMAGE_PROMPTS = {
+    'Character': "Create a highly detailed, front-facing character concept art for a 2D game. The character should be in a neutral pose, with clearly defined features and high contrast. The design should be suitable for 3d rigging and for animation, with clear lines and distinct colors.",
+    'Enemy': "Design a menacing, front-facing enemy character concept art for a 2D game. The enemy should have a threatening appearance with distinctive features, and be suitable for 3d rigging and animation. The design should be highly detailed with a clear silhouette, in a neutral pose.",
+    'Background': "Create a wide, highly detailed background image for a level of the game. The scene should include a clear distinction between foreground, midground, and background elements. The style should be consistent with the theme, with room for character movement in the foreground.",
+    'Object': "Create a detailed object image for a 2D game. The object should be a key item with a transparent background, easily recognizable, and fitting the theme. The design should be clear, with minimal unnecessary details, to ensure it integrates well into the game environment."
+}
+
+IMAGE_SIZES = {
+    'Character': '1024x1792',
+    'Enemy': '1024x1792',
+    'Background': '1792x1024',
+    'Object': '1024x1024'
+}
+
+# Prompt for one image variation
+def image_prompt(img_type, game_concept, variation):
+    # Incorporate game concept into the prompt
+    return f"{IMAGE_PROMPTS[img_type]} The design should fit the following game concept: {game_concept}. Variation {variation}"
+
+# Inputs that determine one generated image
+def image_inputs(prompt, img_type, game_concept, convert_to_3d, **options):
+    return asset_inputs(prompt, IMAGE_MODEL, IMAGE_SIZES[img_type], upstream=[content_hash(game_concept)], convert_to_3d=convert_to_3d, **options)
+
 # Generate multiple images based on customization settings
-def generate_images(customization, game_concept):
+def generate_images(customization, game_concept, build=None, token=None):
     images = {}
     
-    # Base prompts
-    image_prompts = {
-        'Character': "Create a highly detailed, front-facing character concept art for a 2D game. The character should be in a neutral pose, with clearly defined features and high contrast. The design should be suitable for 3d rigging and for animation, with clear lines and distinct colors.",
-        'Enemy': "Design a menacing, front-facing enemy character concept art for a 2D game. The enemy should have a threatening appearance with distinctive features, and be suitable for 3d rigging and animation. The design should be highly detailed with a clear silhouette, in a neutral pose.",
-        'Background': "Create a wide, highly detailed background image for a level of the game. The scene should include a clear distinction between foreground, midground, and background elements. The style should be consistent with the theme, with room for character movement in the foreground.",
-        'Object': "Create a detailed object image for a 2D game. The object should be a key item with a transparent background, easily recognizable, and fitting the theme. The design should be clear, with minimal unnecessary details, to ensure it integrates well into the game environment."
-    }
-    
-    sizes = {
-        'Character': '1024x1792',
-        'Enemy': '1024x1792',
-        'Background': '1792x1024',
-        'Object': '1024x1024'
-    }
-
     for img_type in st.session_state.customization['image_types']:
         for i in range(st.session_state.customization['image_count'].get(img_type, 1)):
-            # Incorporate game concept into the prompt
-            prompt = f"{image_prompts[img_type]} The design should fit the following game concept: {game_concept}. Variation {i + 1}"
-            size = sizes[img_type]
-            image_url = generate_image(prompt, size)
-            if st.session_state.customization['use_replicate']['convert_to_3d'] and img_type != 'Background':
-                image_url = convert_image_to_3d(image_url)
-            images[f"{img_type.lower()}_image_{i + 1}"] = image_url
+            prompt = image_prompt(img_type, game_concept, i + 1)
+            size = IMAGE_SIZES[img_type]
+            convert_to_3d = st.session_state.customization['use_replicate']['convert_to_3d'] and img_type != 'Background'
+
+            def produce():
+                image_url = generate_image(prompt, size, token)
+                if convert_to_3d:
+                    image_url = convert_image_to_3d(image_url, token)
+                return image_url
+
+            key = f"{img_type.lower()}_image_{i + 1}"
+            inputs = image_inputs(prompt, img_type, game_concept, convert_to_3d)
+            previous = previous_output(build, 'images', key) if build else None
+            images[key] = build_asset(build, f"images/{key}", inputs, previous, produce)
 
     return images
 
+# Prompt suffixes that push a regenerated variation away from the one it duplicated
+VARIATION_PERTURBATIONS = [
+    "Make this variation clearly distinct from the others: use a different pose, camera angle and colour palette.",
+    "Make this variation unmistakably unique: change the silhouette, lighting and composition completely."
+]
+
+# Flag near-duplicate images by perceptual hash and optionally regenerate them
+# Regenerated images are recorded under their images/<key> entry, so an unchanged rebuild keeps them
+def dedupe_images(images, game_concept, options, build=None, token=None):
+    store = get_asset_store()
+    types_by_prefix = {img_type.lower(): img_type for img_type in IMAGE_PROMPTS}
+    duplicates = []
+    # Images all reused from the previous build were already deduplicated there
+    regenerate = options['regenerate'] and not (build is not None and all(was_reused(build, f"images/{name}") for name in images))
+
+    for attempt in range(MAX_REGENERATION_ATTEMPTS + 1):
+        images = {name: store_url_asset(store, url, 'image', 'image/png') for name, url in images.items()}
+        candidates = {
+            name: ref for name, ref in images.items()
+            if is_ref(ref) and store.info(ref)['media_type'].startswith('image/')
+        }
+        hashes = ensure_hashes(store, candidates.values())
+        names = [name for name, ref in candidates.items() if ref in hashes]
+
+        known_refs = []
+        known_hashes = {}
+        if options['across_plans']:
+            own_refs = set(candidates.values())
+            known_hashes = ensure_hashes(store, [ref for ref in store.list_refs('image') if ref not in own_refs])
+            known_refs = list(known_hashes)
+
+        flagged = find_near_duplicates(
+            np.array([hashes[candidates[name]] for name in names], dtype=np.uint64),
+            options['threshold'],
+            np.array([known_hashes[ref] for ref in known_refs], dtype=np.uint64)
+        )
+        duplicates = [
+            {
+                'image': names[index],
+                'duplicate_of': names[match[1]] if match[0] == 'new' else 'an image from a previous plan',
+                'distance': distance
+            }
+            for index, match, distance in flagged
+        ]
+        if not duplicates or not regenerate or attempt == MAX_REGENERATION_ATTEMPTS:
+            break
+
+        for duplicate in duplicates:
+            prefix, variation = duplicate['image'].rsplit('_image_', 1)
+            img_type = types_by_prefix[prefix]
+            original_prompt = image_prompt(img_type, game_concept, variation)
+            prompt = f"{original_prompt} {VARIATION_PERTURBATIONS[attempt % len(VARIATION_PERTURBATIONS)]}"
+            image_url = generate_image(prompt, IMAGE_SIZES[img_type], token)
+            if build is not None:
+                regenerated_from = content_hash(image_inputs(original_prompt, img_type, game_concept, False))
+                record(build, f"images/{duplicate['image']}", image_inputs(prompt, img_type, game_concept, False, regenerated_from=regenerated_from), image_url)
+            # A failed regeneration keeps the duplicate rather than losing a usable image
+            if is_usable(image_url):
+                images[duplicate['image']] = image_url
+
+    return images, duplicates
+
 # Generate Unity scripts based on customization settings
-def generate_unity_scripts(customization, game_concept):
+def generate_unity_scripts(customization, game_concept, build=None, token=None):
     script_descriptions = {
         'Player': f"Unity script for the player character with WASD controls and space bar to jump or shoot. The character should fit the following game concept: {game_concept}",
         'Enemy': f"Unity script for an enemy character with basic AI behavior. The enemy should fit the following game concept: {game_concept}",
@@ -179,13 +373,102 @@ def generate_unity_scripts(customization, game_concept):
     }
     
     scripts = {}
+    upstream = [content_hash(game_concept)]
+    use_templates = st.session_state.customization.get('script_templates')
+    class_names = set()
+    provider_down = False
     for script_type in st.session_state.customization['script_types']:
-        for i in range(st.session_state.customization['script_count'].get(script_type, 1)):
+        count = st.session_state.customization['script_count'].get(script_type, 1)
+
+        # Reuse scripts whose inputs are unchanged since the previous build
+        stale = []
+        for i in range(count):
+            key = f"{script_type.lower()}_script_{i + 1}.cs"
             desc = f"{script_descriptions[script_type]} - Instance {i + 1}"
-            script_code = generate_content(desc, "Unity scripting")
-            scripts[f"{script_type.lower()}_script_{i + 1}.cs"] = script_code
+            if use_templates:
+                inputs = asset_inputs(desc, STRUCTURED_MODEL, upstream=upstream, scaffold=content_hash(SCAFFOLDS[script_type]['template']))
+            else:
+                inputs = asset_inputs(desc, CHAT_MODEL, upstream=upstream)
+            previous = previous_output(build, 'scripts', key) if build else None
+            if build is not None and is_fresh(build, f"scripts/{key}", inputs, previous):
+                reuse(build, f"scripts/{key}")
+                scripts[key] = previous
+                class_names.add(script_class_name(asset_text(previous)))
+            else:
+                scripts[key] = None
+                stale.append((key, desc, inputs))
+
+        if use_templates:
+            for key, desc, inputs in stale:
+                script_code, error, calls = generate_templated_script(script_type, desc, class_names, provider_down, token)
+                # After a connection failure the remaining scripts are scaffold-only instead of waiting on the provider again
+                provider_down = provider_down or (error or "").startswith("Error: Unable to communicate")
+                class_names.add(script_class_name(script_code))
+                if build is not None:
+                    if error is None:
+                        record(build, f"scripts/{key}", inputs, script_code, calls)
+                    elif calls:
+                        # Scaffold-only scripts stay out of the manifest so the next build fills them in
+                        count_generated(build, calls)
+                scripts[key] = script_code
+            continue
+
+        batch = {}
+        if st.session_state.customization.get('batch_scripts') and len(stale) > 1:
+            batch = generate_script_batch(script_descriptions[script_type], len(stale), token)
+            if build is not None:
+                count_generated(build)
+        for position, (key, desc, inputs) in enumerate(stale):
+            script_code = batch.get(position + 1)
+            calls = 0
+            if script_code is None:
+                # Scripts missing from the batch (or not batched at all) are requested one at a time
+                script_code = generate_content(desc, "Unity scripting", token, kind='bulk')
+                calls = 1
+            if build is not None:
+                record(build, f"scripts/{key}", inputs, script_code, calls)
+            scripts[key] = script_code
     
     return scripts
+
+# Fill the concept-specific sections of a local scaffold; returns (code, error, calls)
+# With provider_down the scaffold is returned at once, without a call
+def generate_templated_script(script_type, description, class_names, provider_down=False, token=None):
+    if provider_down:
+        error, calls = "Error: the provider was unavailable earlier in this run", 0
+    else:
+        sections = generate_structured_content(
+            scaffold_prompt(script_type, description),
+            "Unity scripting",
+            scaffold_schema(script_type),
+            "unity_script_sections",
+            token,
+            kind='bulk'
+        )
+        if not isinstance(sections, str):
+            return fill_scaffold(script_type, sections, class_names), None, 1
+        error, calls = sections, 1
+    note = f"Scaffold only, concept-specific sections were not generated. {error}"
+    return fill_scaffold(script_type, taken=class_names, note=note), error, calls
+
+# Request several scripts of one type in a single response and keep the ones that validate
+def generate_script_batch(description, count, token=None):
+    response_text = generate_content(batch_script_prompt(description, count), "Unity scripting", token, kind='bulk')
+    if response_text.startswith("Error:"):
+        return {}
+
+    valid = {}
+    class_names = set()
+    for index, code in sorted(split_script_batch(response_text, count).items()):
+        if validate_script(code) is not None:
+            continue
+        # Unity needs one class per name, so a repeated class is re-requested
+        class_name = script_class_name(code)
+        if class_name in class_names:
+            continue
+        class_names.add(class_name)
+        valid[index] = code
+    return valid
     
 def create_zip(content_dict):
     zip_buffer = BytesIO()
@@ -215,52 +498,481 @@ def create_zip(content_dict):
     zip_buffer.seek(0)
     return zip_buffer
 
-# Generate a complete game plan
-def generate_game_plan(user_prompt):
-    game_plan = {}
+# Design document sections, in generation order
+DESIGN_SECTIONS = ['game_concept', 'world_concept', 'character_concepts', 'plot']
+
+DESIGN_SECTION_DESCRIPTIONS = {
+    'game_concept': "A new 2D game concept with a detailed theme, setting, and unique features. Ensure the game has WASD controls.",
+    'world_concept': "A detailed world concept for the 2D game.",
+    'character_concepts': "Detailed character concepts for the player and enemies in the 2D game.",
+    'plot': "A plot for the 2D game based on the world and characters of the game."
+}
+
+DESIGN_SECTION_STATUS = {
+    'game_concept': ("Generating game concept...", 0.1),
+    'world_concept': ("Creating world concept...", 0.2),
+    'character_concepts': ("Designing characters...", 0.3),
+    'plot': ("Crafting the plot...", 0.4)
+}
+
+# Generate a single design section with its own request
+def generate_design_section(section, user_prompt, docs, token=None):
+    if section == 'game_concept':
+        return generate_content(f"Invent a new 2D game concept with a detailed theme, setting, and unique features based on the following prompt: {user_prompt}. Ensure the game has WASD controls.", "game design", token)
+    if section == 'world_concept':
+        return generate_content(f"Create a detailed world concept for the 2D game: {docs['game_concept']}", "world building", token)
+    if section == 'character_concepts':
+        return generate_content(f"Create detailed character concepts for the player and enemies in the 2D game: {docs['game_concept']}", "character design", token)
+    return generate_content(f"Create a plot for the 2D game based on the world and characters of the game: {docs['world_concept']} and {docs['character_concepts']}.", "plot development", token)
+
+# JSON schema requiring one non-empty string per requested section
+def design_documents_schema(sections):
+    return {
+        "type": "object",
+        "properties": {section: {"type": "string"} for section in sections},
+        "required": list(sections),
+        "additionalProperties": False
+    }
+
+# Prompt asking for several design sections in one response
+def structured_design_prompt(user_prompt, docs, sections):
+    lines = [f"Write the design documents for a 2D game based on the following prompt: {user_prompt}."]
+    if 'game_concept' in docs:
+        lines.append(f"The game concept is: {docs['game_concept']}")
+    lines.append("Return a JSON object with the following sections, each written as detailed prose:")
+    for section in sections:
+        lines.append(f"- {section}: {DESIGN_SECTION_DESCRIPTIONS[section]}")
+    lines.append("All sections must describe the same game and stay consistent with each other.")
+    return "\n".join(lines)
+
+# Keep only the sections of a structured response that are usable as documents
+def validate_design_sections(payload, sections):
+    valid = {}
+    if not isinstance(payload, dict):
+        return valid
+    for section in sections:
+        value = payload.get(section)
+        if not isinstance(value, str):
+            continue
+        value = value.strip()
+        if len(value) < MIN_SECTION_LENGTH or value.startswith("Error:"):
+            continue
+        valid[section] = value
+    return valid
+
+# Generate the design documents, in one structured request when enabled
+# Returns (docs, {section: model that wrote it}, number of provider calls made)
+def generate_design_documents(user_prompt, customization, update_status, token=None):
+    docs = {}
+    models = {}
+    calls = 0
+    options = customization.get('structured_docs', {})
+
+    if options.get('enabled'):
+        if not options.get('include_concept'):
+            update_status(*DESIGN_SECTION_STATUS['game_concept'])
+            docs['game_concept'] = generate_design_section('game_concept', user_prompt, docs, token)
+            models['game_concept'] = CHAT_MODEL
+            calls += 1
+
+        sections = [section for section in DESIGN_SECTIONS if section not in docs]
+        update_status("Generating design documents...", 0.2)
+        payload = generate_structured_content(
+            structured_design_prompt(user_prompt, docs, sections),
+            "game design",
+            design_documents_schema(sections),
+            "design_documents",
+            token
+        )
+        calls += 1
+        valid = validate_design_sections(payload, sections)
+        # The other sections are written against the concept, so a bad concept invalidates them all
+        if 'game_concept' in sections and 'game_concept' not in valid:
+            valid = {}
+        docs.update(valid)
+        models.update({section: STRUCTURED_MODEL for section in valid})
+
+    # Per-section requests for everything not produced (or rejected) above
+    for section in DESIGN_SECTIONS:
+        if section not in docs:
+            update_status(*DESIGN_SECTION_STATUS[section])
+            docs[section] = generate_design_section(section, user_prompt, docs, token)
+            models[section] = CHAT_MODEL
+            calls += 1
+
+    return docs, models, calls
+
+# Number of provider calls a design documents build makes when nothing fails validation, counted as saved when it is reused
+def design_document_calls(customization):
+    options = customization.get('structured_docs', {})
+    if not options.get('enabled'):
+        return len(DESIGN_SECTIONS)
+    return 1 if options.get('include_concept') else 2
+
+# Generate a complete game plan, reusing every asset of previous_plan whose inputs are unchanged
+def generate_game_plan(user_prompt, previous_plan=None, token=None):
+    game_plan = {'user_prompt': user_prompt}
+    build = start_build(previous_plan)
     
     # Status updates
     status = st.empty()
     progress_bar = st.progress(0)
     
+    current_status = {'message': ""}
+
     def update_status(message, progress):
+        if token is not None:
+            token.check()
+        current_status['message'] = message
         status.text(message)
         progress_bar.progress(progress)
 
-    # Generate game concept
-    update_status("Generating game concept...", 0.1)
-    game_plan['game_concept'] = generate_content(f"Invent a new 2D game concept with a detailed theme, setting, and unique features based on the following prompt: {user_prompt}. Ensure the game has WASD controls.", "game design")
-    
-    # Generate world concept
-    update_status("Creating world concept...", 0.2)
-    game_plan['world_concept'] = generate_content(f"Create a detailed world concept for the 2D game: {game_plan['game_concept']}", "world building")
-    
-    # Generate character concepts
-    update_status("Designing characters...", 0.3)
-    game_plan['character_concepts'] = generate_content(f"Create detailed character concepts for the player and enemies in the 2D game: {game_plan['game_concept']}", "character design")
-    
-    # Generate plot
-    update_status("Crafting the plot...", 0.4)
-    game_plan['plot'] = generate_content(f"Create a plot for the 2D game based on the world and characters of the game: {game_plan['world_concept']} and {game_plan['character_concepts']}.", "plot development")
+    # Re-emitting the status lets Streamlit interrupt a run waiting on the provider when the user reruns the app
+    if token is not None:
+        token.heartbeat = lambda: status.text(current_status['message'])
+
+    # Generate game concept, world concept, character concepts and plot
+    customization = st.session_state.customization
+    structured_docs = customization.get('structured_docs', {})
+    docs_model = STRUCTURED_MODEL if structured_docs.get('enabled') else CHAT_MODEL
+    docs_inputs = asset_inputs(user_prompt, docs_model, structured_docs=structured_docs)
+    previous_docs = {section: asset_text(previous_output(build, section)) for section in DESIGN_SECTIONS}
+    if is_fresh(build, "design_documents", docs_inputs, previous_docs):
+        reuse(build, "design_documents", design_document_calls(customization))
+        game_plan.update(previous_docs)
+    else:
+        docs, docs_models, docs_calls = generate_design_documents(user_prompt, customization, update_status, token)
+        # Sections that fell back to per-section requests were written by the chat model
+        record(build, "design_documents", docs_inputs, docs, docs_calls, models=docs_models)
+        game_plan.update(docs)
     
     # Generate images
     update_status("Generating game images...", 0.5)
-    game_plan['images'] = generate_images(st.session_state.customization, game_plan['game_concept'])
+    game_plan['images'] = generate_images(st.session_state.customization, game_plan['game_concept'], build, token)
+    if st.session_state.customization['dedupe_images']['enabled']:
+        update_status("Checking images for near-duplicates...", 0.6)
+        game_plan['images'], game_plan['duplicate_images'] = dedupe_images(
+            game_plan['images'], game_plan['game_concept'], st.session_state.customization['dedupe_images'], build, token
+        )
     
     # Generate scripts
     update_status("Writing Unity scripts...", 0.7)
-    game_plan['scripts'] = generate_unity_scripts(st.session_state.customization, game_plan['game_concept'])
+    game_plan['scripts'] = generate_unity_scripts(st.session_state.customization, game_plan['game_concept'], build, token)
     
     # Optional: Generate music
     if st.session_state.customization['use_replicate']['generate_music']:
         update_status("Composing background music...", 0.9)
         music_prompt = f"Create background music for the game: {game_plan['game_concept']}"
-        game_plan['music'] = generate_music(music_prompt)
+        music_inputs = asset_inputs(music_prompt, MUSIC_MODEL, upstream=[content_hash(game_plan['game_concept'])])
+        game_plan['music'] = build_asset(build, "music", music_inputs, previous_output(build, 'music'), lambda: generate_music(music_prompt, token))
 
+    game_plan['manifest'] = build['manifest']
+    game_plan['build_stats'] = build_summary(build)
     update_status("Game plan generation complete!", 1.0)
 
     return game_plan
 
+# Text of a stored document or script, or the value itself if it was never stored
+def asset_text(value):
+    if is_ref(value):
+        return get_asset_store().get_text(value)
+    return value
+
+# Replicate returns music as a URL, a file output or a list of them
+def music_url(output):
+    if isinstance(output, list):
+        output = output[0] if output else None
+    if output is None or isinstance(output, str):
+        return output
+    return str(output)
+
+# Store a text asset and return its reference; errors are kept inline so they get retried
+def store_text_asset(store, value, kind):
+    if is_ref(value) or not is_usable(value):
+        return value
+    return store.put_text(value, kind)
+
+# Download a generated file into the store and return its reference
+def store_url_asset(store, url, kind, media_type):
+    if is_ref(url) or not isinstance(url, str) or not url.startswith('http'):
+        return url
+    return store.put_url(url, kind, media_type)
+
+# Store every asset of a plan and the plan itself, which then only holds references
+def store_game_plan(game_plan):
+    store = get_asset_store()
+    stored = dict(game_plan)
+    for section in DESIGN_SECTIONS:
+        stored[section] = store_text_asset(store, game_plan[section], 'document')
+    stored['images'] = {
+        name: store_url_asset(store, url, 'image', 'image/png')
+        for name, url in game_plan['images'].items()
+    }
+    stored['scripts'] = {
+        name: store_text_asset(store, code, 'script')
+        for name, code in game_plan['scripts'].items()
+    }
+    if 'music' in game_plan:
+        stored['music'] = store_url_asset(store, music_url(game_plan['music']), 'music', 'audio/mpeg')
+    return store.put_json(stored, 'plan')
+
+# Load a stored plan; assets stay as references
+def load_game_plan(plan_ref):
+    return get_asset_store().get_json(plan_ref)
+
+# Transparent-background copies of the Object images, keyed by image name
+def object_cutouts(store, images, options):
+    if not options['enabled']:
+        return {}
+    object_refs = {
+        img_name: img_ref for img_name, img_ref in images.items()
+        if img_name.startswith('object_image_') and is_ref(img_ref) and store.info(img_ref)['media_type'].startswith('image/')
+    }
+    cutouts = ensure_cutouts(store, object_refs.values(), options['tolerance'], options['softness'], options['feather'])
+    return {img_name: cutouts[img_ref] for img_name, img_ref in object_refs.items() if img_ref in cutouts}
+
+# Pack the selected image types into sprite atlases, preferring cutouts; returns the packed image names
+def write_atlases(zip_file, store, images, cutouts, atlas_options):
+    packed = set()
+    for img_type in atlas_options['image_types']:
+        prefix = f"{img_type.lower()}_image_"
+        sprite_paths = {
+            img_name: store.path(cutouts.get(img_name, img_ref))
+            for img_name, img_ref in images.items()
+            if img_name.startswith(prefix) and is_ref(img_ref) and store.info(img_ref)['media_type'].startswith('image/')
+        }
+        atlases = build_atlases(
+            sprite_paths,
+            f"{img_type.lower()}_atlas",
+            max_size=atlas_options['max_size'],
+            scale=atlas_options['scale']
+        )
+        for image_file, png_bytes, metadata in atlases:
+            zip_file.writestr(f"atlases/{image_file}", png_bytes)
+            zip_file.writestr(f"atlases/{image_file[:-len('.png')]}.json", json.dumps(metadata, indent=2))
+            packed.update(metadata['frames'])
+    return packed
+
+# Write levels of detail for the 3D models of a plan; returns the names of the models written
+def write_model_lods(zip_file, store, images, lod_options):
+    model_paths = {
+        img_name: store.path(img_ref)
+        for img_name, img_ref in images.items()
+        if is_ref(img_ref) and not store.info(img_ref)['media_type'].startswith('image/')
+    }
+    lods = build_lods_for_models(model_paths, lod_options['ratios'])
+    for model_name, files in lods.items():
+        for file_name, data in files.items():
+            zip_file.writestr(f"models/{model_name}/{file_name}", data)
+    return set(lods)
+
+# Render every logo style and size for the given text in one batch
+def write_logos(zip_file, text):
+    variants = [
+        (f"logos/logo_{style}_{font_size}.png", dict(colours, text=text, font_size=font_size))
+        for style, colours in LOGO_STYLES.items()
+        for font_size in LOGO_FONT_SIZES
+    ]
+    for (file_name, _), png_bytes in zip(variants, render_logos([variant for _, variant in variants])):
+        zip_file.writestr(file_name, png_bytes)
+
+# Write stored images as PNG, converting other raster formats
+def write_png_images(zip_file, store, images):
+    for file_stem, img_ref in images.items():
+        if store.info(img_ref)['media_type'] == 'image/png':
+            zip_file.writestr(f"{file_stem}.png", store.get_bytes(img_ref))
+        else:
+            img = Image.open(store.path(img_ref))
+            with BytesIO() as img_buffer:
+                img.save(img_buffer, format='PNG')
+                zip_file.writestr(f"{file_stem}.png", img_buffer.getvalue())
+
+# Write optimized stored images in worker processes, palette-quantizing Object images; returns the per-asset report
+def write_optimized_images(zip_file, store, images, optimize_options):
+    image_paths = {file_stem: store.path(img_ref) for file_stem, img_ref in images.items()}
+    object_names = [file_stem for file_stem in images if 'object_image_' in file_stem]
+    optimized = optimize_images(image_paths, object_names, optimize_options['quality'], optimize_options['webp'])
+    report = []
+    for file_stem, (data, extension, asset_report) in optimized.items():
+        zip_file.writestr(f"{file_stem}{extension}", data)
+        report.append(dict(asset_report, file=f"{file_stem}{extension}"))
+    # Images the optimizer could not read are exported unchanged
+    write_png_images(zip_file, store, {file_stem: img_ref for file_stem, img_ref in images.items() if file_stem not in optimized})
+    return report
+
+# Store name of a plan's export ZIP for the current export options
+def plan_export_name(plan_ref, customization):
+    export_options = {
+        'atlas': customization['export_atlas'] if customization['export_atlas']['enabled'] else None,
+        'remove_background': customization['remove_background'] if customization['remove_background']['enabled'] else None,
+        'mesh_lod': customization['mesh_lod'] if customization['mesh_lod']['enabled'] else None,
+        'logo_text': customization['logo_text'],
+        'optimize_images': customization['optimize_images'] if customization['optimize_images']['enabled'] else None
+    }
+    return f"zip:{plan_ref}:{content_hash(export_options)}"
+
+# Build the ZIP export of a stored plan once per export settings and keep it in the store
+def plan_zip_ref(plan_ref, game_plan, customization):
+    store = get_asset_store()
+    atlas_options = customization['export_atlas']
+    background_options = customization['remove_background']
+    lod_options = customization['mesh_lod']
+    optimize_options = customization['optimize_images']
+    export_name = plan_export_name(plan_ref, customization)
+    zip_ref = store.get_name(export_name)
+    if zip_ref:
+        return zip_ref
+
+    zip_buffer = BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
+        cutouts = object_cutouts(store, game_plan['images'], background_options)
+        raster_images = {f"cutouts/{img_name}": cutout_ref for img_name, cutout_ref in cutouts.items()}
+        packed = write_atlases(zip_file, store, game_plan['images'], cutouts, atlas_options) if atlas_options['enabled'] else set()
+        lod_models = write_model_lods(zip_file, store, game_plan['images'], lod_options) if lod_options['enabled'] else set()
+        for img_name, img_ref in game_plan['images'].items():
+            if not is_ref(img_ref) or img_name in packed or img_name in lod_models:
+                continue
+            media_type = store.info(img_ref)['media_type']
+            if media_type.startswith('image/'):
+                raster_images[img_name] = img_ref
+            else:
+                extension = mimetypes.guess_extension(media_type) or ''
+                zip_file.writestr(f"{img_name}{extension}", store.get_bytes(img_ref))
+        optimization_report = None
+        if optimize_options['enabled']:
+            optimization_report = write_optimized_images(zip_file, store, raster_images, optimize_options)
+            zip_file.writestr("optimization_report.json", json.dumps(optimization_report, indent=2))
+        else:
+            write_png_images(zip_file, store, raster_images)
+        for script_name, script_code in game_plan['scripts'].items():
+            zip_file.writestr(script_name, asset_text(script_code))
+        if customization['logo_text']:
+            write_logos(zip_file, customization['logo_text'])
+
+    zip_ref = store.put_bytes(zip_buffer.getvalue(), 'export', 'application/zip')
+    if optimization_report is not None:
+        store.set_metadata(zip_ref, 'optimization_report', json.dumps(optimization_report))
+    store.set_name(export_name, zip_ref)
+    return zip_ref
+
+# Display a stored game plan
+def render_game_plan(plan_ref):
+    store = get_asset_store()
+    game_plan = load_game_plan(plan_ref)
+
+    st.subheader("Game Concept")
+    st.write(asset_text(game_plan['game_concept']))
+
+    st.subheader("World Concept")
+    st.write(asset_text(game_plan['world_concept']))
+
+    st.subheader("Character Concepts")
+    st.write(asset_text(game_plan['character_concepts']))
+
+    st.subheader("Plot")
+    st.write(asset_text(game_plan['plot']))
+
+    # Asset sections are collapsed and paginated so reruns only render one page of each
+    st.subheader("Assets")
+    with st.expander(f"Images ({len(game_plan['images'])})"):
+        for duplicate in game_plan.get('duplicate_images', []):
+            st.warning(f"{duplicate['image']} looks like a near-duplicate of {duplicate['duplicate_of']} (hash distance {duplicate['distance']}).")
+        render_image_gallery(store, game_plan['images'], key="plan_images")
+    cutouts = object_cutouts(store, game_plan['images'], st.session_state.customization['remove_background'])
+    if cutouts:
+        with st.expander(f"Object Cutouts ({len(cutouts)})"):
+            render_image_gallery(store, cutouts, key="plan_cutouts")
+
+    with st.expander(f"Scripts ({len(game_plan['scripts'])})"):
+        render_script_list(store, game_plan['scripts'], key="plan_scripts")
+
+    # Save results; the export is only built on request, once per plan and set of export options
+    zip_ref = store.get_name(plan_export_name(plan_ref, st.session_state.customization))
+    if zip_ref is None:
+        build_button = st.empty()
+        if build_button.button("Build export"):
+            build_button.empty()
+            with st.spinner("Building export..."):
+                zip_ref = plan_zip_ref(plan_ref, game_plan, st.session_state.customization)
+    if zip_ref is None:
+        st.caption("Build the export to download a ZIP of the assets and scripts with the current export options.")
+        optimization_report = None
+    else:
+        st.download_button("Download ZIP of Assets and Scripts", partial(store.get_bytes, zip_ref), file_name="game_plan.zip")
+        optimization_report = store.get_metadata([zip_ref], 'optimization_report').get(zip_ref)
+    if optimization_report:
+        optimization_report = json.loads(optimization_report)
+        total = summarize(optimization_report)
+        with st.expander(f"Image optimization: {total['original_bytes'] / 1e6:.2f} MB -> {total['optimized_bytes'] / 1e6:.2f} MB"):
+            st.table([
+                {
+                    'File': asset['file'],
+                    'Method': asset['method'],
+                    'Original (kB)': round(asset['original_bytes'] / 1e3, 1),
+                    'Optimized (kB)': round(asset['optimized_bytes'] / 1e3, 1),
+                    'Time (ms)': round(asset['seconds'] * 1e3)
+                }
+                for asset in optimization_report
+            ])
+
+    # Display generated music if applicable
+    if 'music' in game_plan:
+        st.subheader("Generated Music")
+        if is_ref(game_plan['music']):
+            st.audio(store.path(game_plan['music']), format='audio/mp3')
+        else:
+            st.write("Failed to generate music.")
+
+# Show a past plan; generating from it reuses every asset whose inputs are unchanged
+def open_plan(plan_ref, user_prompt=None):
+    st.session_state.game_plan_ref = plan_ref
+    st.query_params['plan'] = plan_ref[len(REF_PREFIX):]
+    if user_prompt:
+        st.session_state.user_prompt = user_prompt
+
+# Search past plans and offer their plans and scripts for reuse
+def render_plan_search():
+    query = st.text_input("Search past plans", placeholder="e.g. pirate platformer, PlayerController")
+    if not query.strip():
+        return
+    store = get_asset_store()
+    start = time.perf_counter()
+    results = get_plan_index(store).search(query)
+    st.caption(f"{len(results)} matches in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    plans = {}
+    for result in results:
+        plans.setdefault(result['plan'], []).append(result)
+    for plan_ref, matches in plans.items():
+        with st.container(border=True):
+            st.markdown(f"**{matches[0]['title']}**")
+            for match in matches:
+                st.caption(f"{match['name']}: {match['snippet']}")
+                if match['section'] == 'script' and match['asset']:
+                    st.download_button(
+                        f"Download {match['name']}",
+                        data=partial(store.get_bytes, match['asset']),
+                        file_name=match['name'],
+                        key=f"search_download_{plan_ref}_{match['name']}"
+                    )
+            st.button(
+                "Open plan",
+                key=f"search_open_{plan_ref}",
+                on_click=open_plan,
+                args=(plan_ref, load_game_plan(plan_ref).get('user_prompt')),
+                disabled=plan_ref == st.session_state.game_plan_ref
+            )
+
+# Fill the prompt with a pre-generated random concept
+def surprise_me():
+    if st.session_state.api_keys['openai']:
+        concept = get_random_game_concept(st.session_state.api_keys['openai'], session_id=st.session_state.session_id)
+        # A failed fallback request is shown instead of replacing the user's prompt
+        if concept.startswith("Error:"):
+            st.session_state.surprise_error = concept
+        else:
+            st.session_state.user_prompt = concept
+
 # Streamlit app layout
 st.title("Automate Your Game Dev")
 
@@ -268,7 +980,7 @@ st.title("Automate Your Game Dev")
 st.sidebar.title("Settings")
 
 # API Key Inputs (in the sidebar)
-api_tab, about_tab = st.sidebar.tabs(["API Keys", "About"])
+api_tab, search_tab, metrics_tab, about_tab = st.sidebar.tabs(["API Keys", "Search", "Metrics", "About"])
 
 with api_tab:
     openai_key = st.text_input("OpenAI API Key", value=st.session_state.api_keys['openai'])
@@ -279,6 +991,34 @@ with api_tab:
         st.session_state.api_keys['replicate'] = replicate_key
         st.success("API Keys saved successfully!")
 
+with search_tab:
+    render_plan_search()
+
+with metrics_tab:
+    metrics = cancellation_metrics()
+    st.write(f"Cancelled runs: {metrics['cancelled_runs']}")
+    st.write(f"In-flight calls aborted: {metrics['aborted_calls']}")
+    st.write(f"In-flight calls abandoned (may still use quota): {metrics['abandoned_calls']}")
+    st.write(f"Queued calls skipped: {metrics['skipped_calls']}")
+
+    for provider in ('openai', 'replicate'):
+        stats = get_scheduler(provider).stats()
+        st.subheader(f"{provider.capitalize()} queue")
+        st.write(f"Running: {stats['running']}/{stats['capacity']}, queued: {stats['queued']}")
+        rows = [
+            {
+                'Session': ('this session' if session_id == st.session_state.session_id else session_id[:8]),
+                'Running': session['running'],
+                'Queued': session['queued'],
+                'Calls': session['granted'],
+                'Avg wait (s)': round(session['average_wait'], 2),
+                'Max wait (s)': round(session['max_wait'], 2)
+            }
+            for session_id, session in stats['sessions'].items()
+        ]
+        if rows:
+            st.table(rows)
+
 with about_tab:
     st.write("""
     # About Automate Your Game Dev
@@ -307,6 +1047,13 @@ for img_type in st.session_state.customization['image_types']:
         value=st.session_state.customization['image_count'][img_type]
     )
 
+dedupe_options = st.session_state.customization['dedupe_images']
+dedupe_options['enabled'] = st.checkbox("Detect near-duplicate images", value=dedupe_options['enabled'])
+if dedupe_options['enabled']:
+    dedupe_options['threshold'] = st.slider("Duplicate threshold (differing hash bits)", min_value=0, max_value=24, value=dedupe_options['threshold'])
+    dedupe_options['regenerate'] = st.checkbox("Regenerate near-duplicates with a varied prompt", value=dedupe_options['regenerate'])
+    dedupe_options['across_plans'] = st.checkbox("Also compare with images from previous plans", value=dedupe_options['across_plans'])
+
 # Script Customization
 st.subheader("Script Customization")
 for script_type in st.session_state.customization['script_types']:
@@ -316,66 +1063,118 @@ for script_type in st.session_state.customization['script_types']:
         value=st.session_state.customization['script_count'][script_type]
     )
 
+st.session_state.customization['script_templates'] = st.checkbox(
+    "Build scripts from local templates (the model only writes concept-specific code)",
+    value=st.session_state.customization['script_templates']
+)
+st.session_state.customization['batch_scripts'] = st.checkbox(
+    "Request scripts of the same type in a single batch",
+    value=st.session_state.customization['batch_scripts'],
+    disabled=st.session_state.customization['script_templates']
+)
+
 # Replicate Options
 st.subheader("Replicate Options")
 st.session_state.customization['use_replicate']['convert_to_3d'] = st.checkbox("Convert Images to 3D [feature not yet working]")
 st.session_state.customization['use_replicate']['generate_music'] = st.checkbox("Generate Music [feature not yet working]")
 
+# Export Options
+st.subheader("Export Options")
+atlas_options = st.session_state.customization['export_atlas']
+atlas_options['enabled'] = st.checkbox("Pack sprites into texture atlases", value=atlas_options['enabled'])
+if atlas_options['enabled']:
+    atlas_options['image_types'] = st.multiselect(
+        "Image types to pack",
+        options=['Object', 'Character', 'Enemy'],
+        default=atlas_options['image_types']
+    )
+    atlas_options['max_size'] = st.selectbox(
+        "Maximum atlas size",
+        options=[1024, 2048, 4096],
+        index=[1024, 2048, 4096].index(atlas_options['max_size'])
+    )
+    atlas_options['scale'] = st.slider("Sprite scale", min_value=0.1, max_value=1.0, value=atlas_options['scale'], step=0.05)
+
+st.session_state.customization['logo_text'] = st.text_input(
+    "Logo text (leave empty to skip logos)",
+    value=st.session_state.customization['logo_text']
+)
+
+lod_options = st.session_state.customization['mesh_lod']
+lod_options['enabled'] = st.checkbox("Generate levels of detail for 3D models", value=lod_options['enabled'])
+if lod_options['enabled']:
+    lod_options['ratios'] = sorted(st.multiselect(
+        "LOD triangle ratios",
+        options=[0.75, 0.5, 0.25, 0.1, 0.05],
+        default=lod_options['ratios']
+    ), reverse=True)
+
+optimize_options = st.session_state.customization['optimize_images']
+optimize_options['enabled'] = st.checkbox("Optimize exported images", value=optimize_options['enabled'])
+if optimize_options['enabled']:
+    optimize_options['quality'] = st.select_slider(
+        "Size vs quality",
+        options=list(QUALITY_PRESETS),
+        value=optimize_options['quality'],
+        help="lossless recompresses PNGs only; balanced and small also convert flat-art Object images to palette PNGs"
+    )
+    optimize_options['webp'] = st.checkbox("Export images as WebP", value=optimize_options['webp'])
+
+background_options = st.session_state.customization['remove_background']
+background_options['enabled'] = st.checkbox("Remove backgrounds from Object images", value=background_options['enabled'])
+if background_options['enabled']:
+    background_options['tolerance'] = st.slider("Background colour tolerance", min_value=5, max_value=120, value=background_options['tolerance'])
+    background_options['softness'] = st.slider("Edge softness", min_value=1, max_value=80, value=background_options['softness'])
+    background_options['feather'] = st.slider("Edge feather (pixels)", min_value=0, max_value=5, value=background_options['feather'])
+
+# Document Options
+st.subheader("Document Options")
+st.session_state.customization['structured_docs']['enabled'] = st.checkbox(
+    "Generate world, characters and plot in a single request",
+    value=st.session_state.customization['structured_docs']['enabled']
+)
+st.session_state.customization['structured_docs']['include_concept'] = st.checkbox(
+    "Include the game concept in the same request",
+    value=st.session_state.customization['structured_docs']['include_concept'],
+    disabled=not st.session_state.customization['structured_docs']['enabled']
+)
+
 # Generate Game Plan
 st.header("Generate Game Plan")
-user_prompt = st.text_area("Describe your game concept", "Enter a detailed description of your game here...")
+if 'user_prompt' not in st.session_state:
+    st.session_state.user_prompt = "Enter a detailed description of your game here..."
+user_prompt = st.text_area("Describe your game concept", key="user_prompt")
+st.button("Surprise Me", on_click=surprise_me, disabled=not st.session_state.api_keys['openai'])
+if st.session_state.get('surprise_error'):
+    st.error(st.session_state.pop('surprise_error'))
 if st.button("Generate Game Plan"):
     if not st.session_state.api_keys['openai'] or not st.session_state.api_keys['replicate']:
         st.error("Please enter and save both OpenAI and Replicate API keys.")
     else:
-        game_plan = generate_game_plan(user_prompt)
+        # A new run supersedes any run of this session that is still in flight
+        if st.session_state.get('run_token') is not None:
+            st.session_state.run_token.cancel()
+        st.session_state.run_token = CancellationToken()
 
-        # Display game plan results
-        st.subheader("Game Concept")
-        st.write(game_plan['game_concept'])
+        previous_plan = load_game_plan(st.session_state.game_plan_ref) if st.session_state.game_plan_ref else None
+        try:
+            game_plan = generate_game_plan(user_prompt, previous_plan, st.session_state.run_token)
+        except CancelledError:
+            game_plan = None
+            st.warning("Game plan generation was cancelled.")
+        st.session_state.run_token = None
 
-        st.subheader("World Concept")
-        st.write(game_plan['world_concept'])
+        if game_plan is not None:
+            st.session_state.game_plan_ref = store_game_plan(game_plan)
+            get_plan_index().index_plan(st.session_state.game_plan_ref)
+            st.query_params['plan'] = st.session_state.game_plan_ref[len(REF_PREFIX):]
 
-        st.subheader("Character Concepts")
-        st.write(game_plan['character_concepts'])
+            stats = game_plan['build_stats']
+            if stats['skipped']:
+                st.info(f"Reused {stats['skipped']} of {stats['skipped'] + stats['generated']} generation calls from the previous plan.")
 
-        st.subheader("Plot")
-        st.write(game_plan['plot'])
-
-        st.subheader("Assets")
-        st.write("### Images")
-        for img_name, img_url in game_plan['images'].items():
-            st.write(f"{img_name}: [View Image]({img_url})")
-            if st.session_state.customization['use_replicate']['convert_to_3d'] and 'background' not in img_name.lower():
-                st.write(f"3D Model: [View 3D Model]({convert_image_to_3d(img_url)})")
-        
-        st.write("### Scripts")
-        for script_name, script_code in game_plan['scripts'].items():
-            st.write(f"{script_name}:\n```csharp\n{script_code}\n```")
-
-        # Save results
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-            for img_name, img_url in game_plan['images'].items():
-                if img_url.startswith('http'):
-                    img_response = requests.get(img_url)
-                    img = Image.open(BytesIO(img_response.content))
-                    img_file_name = f"{img_name}.png"
-                    with BytesIO() as img_buffer:
-                        img.save(img_buffer, format='PNG')
-                        zip_file.writestr(img_file_name, img_buffer.getvalue())
-            for script_name, script_code in game_plan['scripts'].items():
-                zip_file.writestr(script_name, script_code)
-
-        st.download_button("Download ZIP of Assets and Scripts", zip_buffer.getvalue(), file_name="game_plan.zip")
-
-        # Display generated music if applicable
-        if st.session_state.customization['use_replicate']['generate_music']:
-            st.subheader("Generated Music")
-            if game_plan.get('music'):
-                st.audio(game_plan['music'], format='audio/mp3')
-            else:
-                st.write("Failed to generate music.")
+# Display game plan results
+if st.session_state.game_plan_ref:
+    render_game_plan(st.session_state.game_plan_ref)
 
 # End of the Streamlit app
@@ -2,30 +2,63 @@ import streamlit as st
 import requests
 import json
 import os
+import uuid
 import zipfile
 from io import BytesIO
 from PIL import Image
 import replicate
+from asset_store import get_asset_store, is_ref, REF_PREFIX
+from gallery import render_image_gallery, render_script_list
+from scheduler import get_scheduler
+from image_optimizer import QUALITY_PRESETS, optimize_images, summarize
 
 # Constants
 CHAT_API_URL = "https://api.openai.com/v1/chat/completions"
 DALLE_API_URL = "https://api.openai.com/v1/images/generations"
 REPLICATE_API_URL = "https://api.replicate.com/v1/predictions"  # Optional
 API_KEY_FILE = "api_key.json"
+# Connect and read timeouts in seconds; a hung provider call must not hold a shared scheduler slot forever
+PROVIDER_TIMEOUT = (10, 180)
 
 # Initialize session state
 if 'api_keys' not in st.session_state:
     st.session_state.api_keys = {'openai': None, 'replicate': None}
 
+# Identifies this browser session to the process-wide provider scheduler
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 if 'customization' not in st.session_state:
     st.session_state.customization = {
         'image_types': ['Character', 'Enemy', 'Background', 'Object'],
         'script_types': ['Player', 'Enemy', 'Game Object', 'Level Background'],
         'image_count': {'Character': 1, 'Enemy': 1, 'Background': 1, 'Object': 2},
         'script_count': {'Player': 1, 'Enemy': 1, 'Game Object': 3, 'Level Background': 1},
-        'use_replicate': {'convert_to_3d': False, 'generate_music': False}
+        'use_replicate': {'convert_to_3d': False, 'generate_music': False},
+        'optimize_images': {'enabled': False, 'quality': 'balanced', 'webp': False}
     }
 
+# Options added after a session was started
+st.session_state.customization.setdefault('optimize_images', {'enabled': False, 'quality': 'balanced', 'webp': False})
+
+# Generated results are kept in the store and the URL so they survive restarts
+RESULT_KEYS = ['generated_images', 'generated_scripts', 'generated_music']
+
+if 'results_restored' not in st.session_state:
+    st.session_state.results_restored = True
+    results_ref = f"{REF_PREFIX}{st.query_params.get('results', '')}"
+    # Only a well-formed reference to stored results is accepted from the URL
+    results_info = get_asset_store().info(results_ref) if is_ref(results_ref) else None
+    if results_info and results_info['kind'] == 'results':
+        for key, refs in get_asset_store().get_json(results_ref).items():
+            if key in RESULT_KEYS:
+                st.session_state[key] = refs
+
+# Store the current results and point the URL at them
+def save_results():
+    results = {key: st.session_state[key] for key in RESULT_KEYS if key in st.session_state}
+    st.query_params['results'] = get_asset_store().put_json(results, 'results')[len(REF_PREFIX):]
+
 # Load API keys from a file
 def load_api_keys():
     if os.path.exists(API_KEY_FILE):
@@ -46,6 +79,10 @@ def get_openai_headers():
         "Content-Type": "application/json"
     }
 
+# Make a provider call once this session is granted a slot in the provider's shared quota
+def provider_call(provider, function, *args, **kwargs):
+    return get_scheduler(provider).run(st.session_state.session_id, function, *args, kind='bulk', **kwargs)
+
 # Generate content using OpenAI API
 def generate_content(prompt, role):
     data = {
@@ -57,7 +94,7 @@ def generate_content(prompt, role):
     }
 
     try:
-        response = requests.post(CHAT_API_URL, headers=get_openai_headers(), json=data)
+        response = provider_call('openai', requests.post, CHAT_API_URL, headers=get_openai_headers(), json=data, timeout=PROVIDER_TIMEOUT)
         response.raise_for_status()
         response_data = response.json()
         if "choices" not in response_data:
@@ -81,7 +118,7 @@ def generate_image(prompt, size):
     }
 
     try:
-        response = requests.post(DALLE_API_URL, headers=get_openai_headers(), json=data)
+        response = provider_call('openai', requests.post, DALLE_API_URL, headers=get_openai_headers(), json=data, timeout=PROVIDER_TIMEOUT)
         response.raise_for_status()
         response_data = response.json()
         if "data" not in response_data:
@@ -109,7 +146,7 @@ def convert_image_to_3d(image_url):
     }
 
     try:
-        response = requests.post("https://api.replicate.com/v1/predictions", headers=headers, json=data)
+        response = provider_call('replicate', requests.post, "https://api.replicate.com/v1/predictions", headers=headers, json=data, timeout=PROVIDER_TIMEOUT)
         response.raise_for_status()
         response_data = response.json()
         return response_data.get('output', {}).get('url')
@@ -118,7 +155,7 @@ def convert_image_to_3d(image_url):
 
 # Generate music using Replicate's MusicGen
 def generate_music(prompt):
-    replicate_client = replicate.Client(api_token=st.session_state.api_keys['replicate'])
+    replicate_client = replicate.Client(api_token=st.session_state.api_keys['replicate'], timeout=PROVIDER_TIMEOUT[1])
     
     try:
         input_data = {
@@ -128,7 +165,9 @@ def generate_music(prompt):
             "normalization_strategy": "peak"
         }
         
-        output = replicate_client.run(
+        output = provider_call(
+            'replicate',
+            replicate_client.run,
             "meta/musicgen:671ac645ce5e552cc63a54a2bbff63fcf798043055d2dac5fc9e36a837eedcfb",
             input=input_data
         )
@@ -185,29 +224,64 @@ def generate_unity_scripts(customization):
     
     return scripts
     
-def create_zip(content_dict):
+# Build the export ZIP; returns the buffer and the per-image optimization report (None when not optimizing)
+def create_zip(content_dict, optimize_options=None):
+    store = get_asset_store()
     zip_buffer = BytesIO()
+    report = None
     with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
         for key, value in content_dict.items():
             if key == "unity_scripts":
-                for script_key, script_value in value.items():
-                    zip_file.writestr(script_key, script_value)
+                for script_key, script_ref in value.items():
+                    zip_file.writestr(script_key, store.get_text(script_ref) if is_ref(script_ref) else script_ref)
             elif key == "images":
-                for image_key, image_url in value.items():
-                    response = requests.get(image_url)
-                    image = Image.open(BytesIO(response.content))
+                optimized = {}
+                if optimize_options and optimize_options['enabled']:
+                    image_paths = {image_key: store.path(image_ref) for image_key, image_ref in value.items() if is_ref(image_ref)}
+                    object_keys = [image_key for image_key in image_paths if image_key.startswith('object_image_')]
+                    optimized = optimize_images(image_paths, object_keys, optimize_options['quality'], optimize_options['webp'])
+                    report = []
+                    for image_key, (data, extension, asset_report) in optimized.items():
+                        zip_file.writestr(f"{image_key}{extension}", data)
+                        report.append(dict(asset_report, file=f"{image_key}{extension}"))
+                    zip_file.writestr("optimization_report.json", json.dumps(report, indent=2))
+                for image_key, image_ref in value.items():
+                    if not is_ref(image_ref) or image_key in optimized:
+                        continue
                     image_filename = f"{image_key}.png"
-                    image.save(image_filename)
-                    zip_file.write(image_filename)
-                    os.remove(image_filename)
+                    if store.info(image_ref)['media_type'] == 'image/png':
+                        zip_file.writestr(image_filename, store.get_bytes(image_ref))
+                    else:
+                        image = Image.open(store.path(image_ref))
+                        with BytesIO() as image_buffer:
+                            image.save(image_buffer, format='PNG')
+                            zip_file.writestr(image_filename, image_buffer.getvalue())
             elif key == "music":
-                for music_key, music_url in value.items():
-                    response = requests.get(music_url)
-                    music_data = BytesIO(response.content)
-                    zip_file.writestr(music_key, music_data.read())
+                for music_key, music_ref in value.items():
+                    if is_ref(music_ref):
+                        zip_file.writestr(music_key, store.get_bytes(music_ref))
     
     zip_buffer.seek(0)
-    return zip_buffer
+    return zip_buffer, report
+
+# Download generated files into the asset store so session state only keeps references
+def store_generated_urls(urls, kind, media_type):
+    store = get_asset_store()
+    refs = {}
+    for key, url in urls.items():
+        if isinstance(url, list):
+            url = url[0] if url else None
+        if url is not None and not isinstance(url, str):
+            url = str(url)
+        refs[key] = store.put_url(url, kind, media_type) if url and url.startswith('http') else url
+    return refs
+
+def store_generated_scripts(scripts):
+    store = get_asset_store()
+    return {
+        file_name: script_code if script_code.startswith("Error:") else store.put_text(script_code, 'script')
+        for file_name, script_code in scripts.items()
+    }
 
 # Streamlit app layout
 st.sidebar.header("API Keys")
@@ -228,10 +302,9 @@ with tab1:
     image_types = st.multiselect("Select image types", options=st.session_state.customization['image_types'])
     if st.button("Generate Images"):
         images = generate_images(st.session_state.customization)
-        st.session_state.generated_images = images
-        for key, url in images.items():
-            st.image(url, caption=key)
-            st.download_button(label=f"Download {key}", data=requests.get(url).content, file_name=f"{key}.png")
+        st.session_state.generated_images = store_generated_urls(images, 'image', 'image/png')
+        save_results()
+    render_image_gallery(get_asset_store(), st.session_state.get('generated_images', {}), key="generated_images")
 
 with tab2:
     st.header("Generate Documents")
@@ -241,10 +314,9 @@ with tab3:
     st.header("Generate Scripts/Codes")
     if st.button("Generate Scripts"):
         scripts = generate_unity_scripts(st.session_state.customization)
-        st.session_state.generated_scripts = scripts
-        for file_name, script_code in scripts.items():
-            st.code(script_code, language='csharp')
-            st.download_button(label=f"Download {file_name}", data=script_code, file_name=file_name)
+        st.session_state.generated_scripts = store_generated_scripts(scripts)
+        save_results()
+    render_script_list(get_asset_store(), st.session_state.get('generated_scripts', {}), key="generated_scripts")
 
 with tab4:
     st.header("Advanced Options")
@@ -254,9 +326,19 @@ with tab4:
         music_prompt = st.text_input("Music generation prompt", "Create background music for a 2D game level.")
         if st.button("Generate Music"):
             music_url = generate_music(music_prompt)
-            st.session_state.generated_music = {'background_music': music_url}
-            st.audio(music_url)
-            st.download_button(label="Download Music", data=requests.get(music_url).content, file_name="background_music.mp3")
+            st.session_state.generated_music = store_generated_urls({'background_music': music_url}, 'music', 'audio/mpeg')
+            save_results()
+        music_ref = st.session_state.get('generated_music', {}).get('background_music')
+        if is_ref(music_ref):
+            st.audio(get_asset_store().path(music_ref))
+            st.download_button(label="Download Music", data=get_asset_store().get_bytes(music_ref), file_name="background_music.mp3")
+        elif music_ref:
+            st.write(music_ref)
+    optimize_options = st.session_state.customization['optimize_images']
+    optimize_options['enabled'] = st.checkbox("Optimize exported images", value=optimize_options['enabled'])
+    if optimize_options['enabled']:
+        optimize_options['quality'] = st.select_slider("Size vs quality", options=list(QUALITY_PRESETS), value=optimize_options['quality'])
+        optimize_options['webp'] = st.checkbox("Export images as WebP", value=optimize_options['webp'])
     st.write("Additional advanced options and settings can be added here.")
 
 # Generate and download ZIP of all assets
@@ -267,5 +349,11 @@ if st.button("Generate and Download All"):
         "music": st.session_state.get('generated_music', {})
     }
     
-    zip_buffer = create_zip(content_dict)
+    zip_buffer, optimization_report = create_zip(content_dict, st.session_state.customization['optimize_images'])
     st.download_button(label="Download All Assets", data=zip_buffer, file_name="game_assets.zip")
+    if optimization_report:
+        total = summarize(optimization_report)
+        st.caption(
+            f"Images optimized from {total['original_bytes'] / 1e6:.2f} MB to {total['optimized_bytes'] / 1e6:.2f} MB "
+            f"in {total['seconds']:.1f} s of worker time; see optimization_report.json in the ZIP for each image."
+        )
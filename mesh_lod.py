@@ -0,0 +1,189 @@
+# mesh_lod.py
+import json
+
+import numpy as np
+
+from worker_pool import map_in_processes, MAX_WORKERS
+
+LOD_RATIOS = [0.5, 0.25, 0.1]
+# Screen-relative heights below which Unity's LODGroup switches to the next level
+LOD_TRANSITIONS = [0.6, 0.3, 0.1, 0.02]
+MIN_FACES = 12
+MAX_PASSES = 200
+
+def load_obj(data):
+    """Vertices (n, 3) and triangle faces (m, 3) of an OBJ file; polygons are fan-triangulated.
+
+    Raises ValueError for malformed numbers and for face indices that do not name a vertex.
+    """
+    vertices = []
+    faces = []
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        if parts[0] == "v" and len(parts) >= 4:
+            vertices.append([float(value) for value in parts[1:4]])
+        elif parts[0] == "f" and len(parts) >= 4:
+            indices = []
+            for part in parts[1:]:
+                index = int(part.split("/")[0])
+                if index == 0:
+                    raise ValueError("OBJ vertex indices start at 1")
+                # OBJ indices are 1-based, negative ones count back from the latest vertex
+                indices.append(index - 1 if index > 0 else len(vertices) + index)
+            for corner in range(1, len(indices) - 1):
+                faces.append([indices[0], indices[corner], indices[corner + 1]])
+    vertices = np.array(vertices, dtype=np.float64).reshape(-1, 3)
+    faces = np.array(faces, dtype=np.int64).reshape(-1, 3)
+    if ((faces < 0) | (faces >= len(vertices))).any():
+        raise ValueError("Face references a missing vertex")
+    return vertices, faces
+
+def save_obj(vertices, faces):
+    lines = [f"v {x:.6f} {y:.6f} {z:.6f}" for x, y, z in vertices]
+    lines += [f"f {a + 1} {b + 1} {c + 1}" for a, b, c in faces]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+def face_quadrics(vertices, faces):
+    """Fundamental error quadric (4x4) of each face's plane, weighted by face area."""
+    corners = vertices[faces]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    valid = lengths > 1e-12
+    normals[valid] /= lengths[valid, None]
+    planes = np.concatenate([normals, -(normals * corners[:, 0]).sum(axis=1, keepdims=True)], axis=1)
+    planes[~valid] = 0.0
+    return planes[:, :, None] * planes[:, None, :] * (lengths[:, None, None] / 2.0)
+
+def vertex_quadrics(vertices, faces):
+    quadrics = np.zeros((len(vertices), 4, 4))
+    per_face = face_quadrics(vertices, faces)
+    for corner in range(3):
+        np.add.at(quadrics, faces[:, corner], per_face)
+    return quadrics
+
+def quadric_error(quadrics, positions):
+    homogeneous = np.concatenate([positions, np.ones((len(positions), 1))], axis=1)
+    return np.einsum("ni,nij,nj->n", homogeneous, quadrics, homogeneous)
+
+def unique_edges(faces):
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    edges.sort(axis=1)
+    return np.unique(edges, axis=0)
+
+def clean_faces(faces):
+    """Drop faces that collapsed to a line or duplicate another face."""
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+    if len(faces) == 0:
+        return faces
+    _, keep = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    return faces[np.sort(keep)]
+
+def compact(vertices, faces):
+    """Remove vertices no longer referenced by any face."""
+    used = np.unique(faces)
+    remap = np.full(len(vertices), -1, dtype=np.int64)
+    remap[used] = np.arange(len(used))
+    return vertices[used], remap[faces]
+
+def decimate(vertices, faces, target_faces):
+    """Quadric-error edge-collapse decimation down to about target_faces triangles.
+
+    Instead of one collapse at a time from a priority queue, each pass collapses a
+    batch of edges at once: an edge is collapsed when it is the cheapest edge of both
+    its endpoints, so no two collapses in a batch touch the same vertex.
+    """
+    vertices = vertices.copy()
+    quadrics = vertex_quadrics(vertices, faces)
+    target_faces = max(target_faces, MIN_FACES)
+
+    for _ in range(MAX_PASSES):
+        if len(faces) <= target_faces:
+            break
+        edges = unique_edges(faces)
+        first, second = edges[:, 0], edges[:, 1]
+        combined = quadrics[first] + quadrics[second]
+
+        # Collapse each edge to whichever of its endpoints or midpoint costs least
+        candidates = np.stack([vertices[first], vertices[second], (vertices[first] + vertices[second]) / 2.0], axis=1)
+        costs = np.stack([quadric_error(combined, candidates[:, option]) for option in range(3)], axis=1)
+        best_option = costs.argmin(axis=1)
+        cost = costs[np.arange(len(edges)), best_option]
+        positions = candidates[np.arange(len(edges)), best_option]
+
+        # Rank edges by cost so ties resolve the same way at both endpoints
+        order = np.lexsort((np.arange(len(edges)), cost))
+        rank = np.empty(len(edges), dtype=np.int64)
+        rank[order] = np.arange(len(edges))
+        best_rank = np.full(len(vertices), len(edges), dtype=np.int64)
+        np.minimum.at(best_rank, first, rank)
+        np.minimum.at(best_rank, second, rank)
+        selected = np.nonzero((best_rank[first] == rank) & (best_rank[second] == rank))[0]
+
+        # Each collapse removes about two faces; do not overshoot the target
+        allowed = max(1, (len(faces) - target_faces) // 2)
+        selected = selected[np.argsort(rank[selected])][:allowed]
+        if len(selected) == 0:
+            break
+
+        keep, drop = first[selected], second[selected]
+        vertices[keep] = positions[selected]
+        quadrics[keep] = combined[selected]
+        remap = np.arange(len(vertices))
+        remap[drop] = keep
+        faces = clean_faces(remap[faces])
+
+    return compact(vertices, faces)
+
+def build_lods(vertices, faces, ratios=LOD_RATIOS):
+    """List of (ratio, vertices, faces), starting with the original mesh."""
+    levels = [(1.0, vertices, faces)]
+    current_vertices, current_faces = vertices, faces
+    for ratio in sorted(ratios, reverse=True):
+        # Each level starts from the previous one, which is cheaper than from the full mesh
+        current_vertices, current_faces = decimate(current_vertices, current_faces, int(len(faces) * ratio))
+        levels.append((ratio, current_vertices, current_faces))
+    return levels
+
+def build_lod_files(job):
+    """Process-pool worker: job is (name, path, ratios).
+
+    Returns {file_name: bytes} with one OBJ per level and a LOD manifest, or None
+    if the file is not a readable OBJ mesh. Level 0 is the original file, unchanged,
+    so it keeps its UVs, normals and materials; the decimated levels hold positions only.
+    """
+    name, path, ratios = job
+    with open(path, "rb") as mesh_file:
+        data = mesh_file.read()
+    try:
+        vertices, faces = load_obj(data)
+    except ValueError:
+        return None
+    if len(faces) == 0:
+        return None
+
+    files = {}
+    manifest = {"model": name, "levels": []}
+    for level, (ratio, level_vertices, level_faces) in enumerate(build_lods(vertices, faces, ratios)):
+        file_name = f"{name}_lod{level}.obj"
+        files[file_name] = data if level == 0 else save_obj(level_vertices, level_faces)
+        manifest["levels"].append({
+            "file": file_name,
+            "original": level == 0,
+            "target_ratio": ratio,
+            "vertices": len(level_vertices),
+            "faces": len(level_faces),
+            "screen_relative_height": LOD_TRANSITIONS[min(level, len(LOD_TRANSITIONS) - 1)]
+        })
+    files[f"{name}_lods.json"] = json.dumps(manifest, indent=2).encode("utf-8")
+    return files
+
+def build_lods_for_models(model_paths, ratios=LOD_RATIOS, max_workers=MAX_WORKERS):
+    """Build LODs for {model_name: mesh_path}, one model per worker process.
+
+    Returns {model_name: {file_name: bytes}} for the models that could be read.
+    """
+    jobs = [(name, path, list(ratios)) for name, path in model_paths.items()]
+    results = map_in_processes(build_lod_files, jobs, max_workers)
+    return {name: files for (name, _, _), files in zip(jobs, results) if files}
@@ -0,0 +1,134 @@
+# plan_index.py
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from asset_store import get_asset_store, is_ref
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS plan_documents USING fts5(
+    plan UNINDEXED,
+    asset UNINDEXED,
+    section UNINDEXED,
+    name,
+    body,
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS indexed_plans (
+    plan TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+"""
+
+# Plan fields indexed as documents, besides the scripts
+TEXT_SECTIONS = ['user_prompt', 'game_concept', 'world_concept', 'character_concepts', 'plot']
+# bm25() column weights for (plan, asset, section, name, body); names are short, so a match there counts more
+BM25_WEIGHTS = (0.0, 0.0, 0.0, 4.0, 1.0)
+SNIPPET_TOKENS = 16
+TITLE_LENGTH = 80
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def match_query(text):
+    """FTS5 query matching any of the words in free text, the last one as a prefix.
+
+    Words are quoted so FTS5 operators typed by the user are searched as text.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*']
+    return " OR ".join(terms)
+
+def plan_title(text):
+    first_line = next((line.strip(" #*") for line in text.splitlines() if line.strip(" #*")), "Untitled plan")
+    return first_line if len(first_line) <= TITLE_LENGTH else first_line[:TITLE_LENGTH - 1] + "…"
+
+class PlanIndex:
+    """BM25 full-text index over stored game plans, kept next to the asset store's index."""
+
+    def __init__(self, store):
+        self.store = store
+        self.db_path = os.path.join(store.root, "search.sqlite3")
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _text(self, value):
+        if is_ref(value):
+            return self.store.get_text(value)
+        return value if isinstance(value, str) and not value.startswith("Error:") else None
+
+    def index_plan(self, plan_ref):
+        """Add a stored plan's prompt, design documents and scripts; plans already indexed are skipped."""
+        plan = self.store.get_json(plan_ref)
+        rows = []
+        for section in TEXT_SECTIONS:
+            value = plan.get(section)
+            text = self._text(value)
+            if text:
+                rows.append((plan_ref, value if is_ref(value) else None, section, section.replace('_', ' '), text))
+        for script_name, script_ref in plan.get('scripts', {}).items():
+            text = self._text(script_ref)
+            if text:
+                rows.append((plan_ref, script_ref if is_ref(script_ref) else None, 'script', script_name, text))
+
+        title = plan_title(self._text(plan.get('game_concept')) or self._text(plan.get('user_prompt')) or "")
+        with closing(self._connect()) as connection, connection:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO indexed_plans (plan, title, indexed_at) VALUES (?, ?, ?)", (plan_ref, title, time.time())
+            )
+            if cursor.rowcount == 0:
+                return False
+            connection.executemany(
+                "INSERT INTO plan_documents (plan, asset, section, name, body) VALUES (?, ?, ?, ?, ?)", rows
+            )
+        return True
+
+    def index_missing(self):
+        """Index stored plans that are not in the index yet, e.g. plans from before it existed; returns how many."""
+        with closing(self._connect()) as connection:
+            indexed = {row[0] for row in connection.execute("SELECT plan FROM indexed_plans")}
+        return sum(self.index_plan(plan_ref) for plan_ref in self.store.list_refs('plan') if plan_ref not in indexed)
+
+    def search(self, text, limit=20):
+        """Best-matching documents for free text, best first.
+
+        Returns a list of {plan, title, asset, section, name, snippet, score}; a lower score is a better match.
+        """
+        query = match_query(text)
+        if query is None:
+            return []
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                f"""
+                SELECT plan_documents.plan, indexed_plans.title, asset, section, name,
+                       snippet(plan_documents, 4, '**', '**', '…', {SNIPPET_TOKENS}),
+                       bm25(plan_documents, {', '.join(map(str, BM25_WEIGHTS))}) AS score
+                FROM plan_documents JOIN indexed_plans ON indexed_plans.plan = plan_documents.plan
+                WHERE plan_documents MATCH ?
+                ORDER BY score
+                LIMIT ?
+                """,
+                (query, limit)
+            ).fetchall()
+        keys = ('plan', 'title', 'asset', 'section', 'name', 'snippet', 'score')
+        return [dict(zip(keys, row)) for row in rows]
+
+def get_plan_index(store=None):
+    """Process-wide index for a store, brought up to date with its stored plans when first opened."""
+    store = store or get_asset_store()
+    with _indexes_lock:
+        if store.root not in _indexes:
+            index = PlanIndex(store)
+            index.index_missing()
+            _indexes[store.root] = index
+        return _indexes[store.root]
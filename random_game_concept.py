@@ -1,8 +1,26 @@
+import json
+import re
+import threading
+
 import requests
 import streamlit as st
 
+from asset_store import get_asset_store
+from scheduler import get_scheduler
+
 # Constants
 CHAT_API_URL = "https://api.openai.com/v1/chat/completions"
+CONCEPT_KIND = "random_concept"
+POOL_LOW_WATER = 5
+POOL_BATCH_SIZE = 8
+SIMILARITY_THRESHOLD = 0.35
+SHINGLE_SIZE = 3
+# Connect and read timeouts in seconds; a hung refill must not hold the refill lock forever
+PROVIDER_TIMEOUT = (10, 180)
+# Scheduler session for pool refills, which are not made on behalf of one user session
+POOL_SESSION_ID = "concept-pool"
+
+_refill_lock = threading.Lock()
 
 def get_openai_headers(api_key):
     return {
@@ -10,9 +28,9 @@ def get_openai_headers(api_key):
         "Content-Type": "application/json"
     }
 
-def generate_random_game_concept(api_key):
+def generate_random_game_concept(api_key, session_id=POOL_SESSION_ID):
     prompt = "Generate a random and creative concept for a 2D game. The game should have a unique theme, setting, and interesting mechanics. Make it fun and imaginative."
-    
+
     data = {
         "model": "gpt-4o-mini",
         "messages": [
@@ -22,7 +40,9 @@ def generate_random_game_concept(api_key):
     }
 
     try:
-        response = requests.post(CHAT_API_URL, headers=get_openai_headers(api_key), json=data)
+        response = get_scheduler('openai').run(
+            session_id, requests.post, CHAT_API_URL, headers=get_openai_headers(api_key), json=data, timeout=PROVIDER_TIMEOUT, kind='bulk'
+        )
         response.raise_for_status()
         response_data = response.json()
         if "choices" not in response_data:
@@ -34,3 +54,120 @@ def generate_random_game_concept(api_key):
 
     except requests.RequestException as e:
         return f"Error: Unable to communicate with the OpenAI API: {str(e)}"
+
+def generate_random_game_concepts(api_key, count=POOL_BATCH_SIZE):
+    """Generate several distinct concepts in one structured request; returns a list or an error string."""
+    prompt = (
+        f"Generate {count} random and creative concepts for 2D games. Each game should have a unique theme, "
+        "setting, and interesting mechanics, and the concepts must be clearly different from each other. "
+        "Make them fun and imaginative."
+    )
+    data = {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant specializing in game design."},
+            {"role": "user", "content": prompt}
+        ],
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "game_concepts",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {"concepts": {"type": "array", "items": {"type": "string"}}},
+                    "required": ["concepts"],
+                    "additionalProperties": False
+                }
+            }
+        }
+    }
+
+    try:
+        response = get_scheduler('openai').run(
+            POOL_SESSION_ID, requests.post, CHAT_API_URL, headers=get_openai_headers(api_key), json=data, timeout=PROVIDER_TIMEOUT, kind='bulk'
+        )
+        response.raise_for_status()
+        response_data = response.json()
+        if "choices" not in response_data:
+            error_message = response_data.get("error", {}).get("message", "Unknown error")
+            return f"Error: {error_message}"
+
+        concepts = json.loads(response_data["choices"][0]["message"]["content"])["concepts"]
+        return [concept.strip() for concept in concepts if isinstance(concept, str) and concept.strip()]
+
+    except requests.RequestException as e:
+        return f"Error: Unable to communicate with the OpenAI API: {str(e)}"
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        return f"Error: Invalid structured response: {str(e)}"
+
+def shingles(text):
+    """Set of word n-grams used to compare concepts."""
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+def is_near_duplicate(concept_shingles, existing, threshold=SIMILARITY_THRESHOLD):
+    return any(jaccard(concept_shingles, other) >= threshold for other in existing)
+
+def pool_refs(store):
+    """Concepts in the pool that have not been served yet."""
+    refs = store.list_refs(CONCEPT_KIND)
+    served = store.get_metadata(refs, "served")
+    return [ref for ref in refs if ref not in served]
+
+def refill_pool(api_key, store=None, batch_size=POOL_BATCH_SIZE):
+    """Generate a batch of concepts and add the ones unlike any stored concept; returns how many were added."""
+    store = store or get_asset_store()
+    concepts = generate_random_game_concepts(api_key, batch_size)
+    if isinstance(concepts, str):
+        return 0
+
+    # Compare with every concept ever pooled, served or not, so users are not shown repeats
+    existing = [shingles(store.get_text(ref)) for ref in store.list_refs(CONCEPT_KIND)]
+    added = 0
+    for concept in concepts:
+        concept_shingles = shingles(concept)
+        if is_near_duplicate(concept_shingles, existing):
+            continue
+        store.put_text(concept, CONCEPT_KIND)
+        existing.append(concept_shingles)
+        added += 1
+    return added
+
+def refill_pool_in_background(api_key, store=None):
+    """Start a refill thread unless one is already running in this process."""
+    if not _refill_lock.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            refill_pool(api_key, store)
+        finally:
+            _refill_lock.release()
+
+    threading.Thread(target=run, name="concept-pool-refill", daemon=True).start()
+    return True
+
+def get_random_game_concept(api_key, store=None, low_water=POOL_LOW_WATER, session_id=POOL_SESSION_ID):
+    """Serve a pre-generated concept from the pool, refilling it asynchronously when it runs low.
+
+    Falls back to a blocking single-concept request, scheduled for session_id,
+    only when the pool is empty; that request may return an "Error: ..." string.
+    """
+    store = store or get_asset_store()
+    available = pool_refs(store)
+    if len(available) - 1 < low_water:
+        refill_pool_in_background(api_key, store)
+
+    for ref in available:
+        # Another session may take the same concept first
+        if store.claim(ref, "served"):
+            return store.get_text(ref)
+    return generate_random_game_concept(api_key, session_id)
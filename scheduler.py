@@ -0,0 +1,163 @@
+# scheduler.py
+import itertools
+import threading
+import time
+
+import requests
+
+from cancellation import CancelledError
+
+PROVIDER_CAPACITY = {'openai': 8, 'replicate': 4}
+MAX_CONCURRENT_PER_SESSION = 4
+MAX_QUEUED_PER_SESSION = 32
+# Interactive calls advance their session's virtual time four times slower than bulk calls
+WEIGHTS = {'interactive': 4.0, 'bulk': 1.0}
+POLL_INTERVAL = 0.1
+# A call that cannot get a slot within this many seconds fails instead of queuing forever
+MAX_QUEUE_WAIT = 300
+IDLE_SESSION_SECONDS = 3600
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+class QueueFullError(requests.RequestException):
+    """Raised when a session already has its maximum number of queued calls.
+
+    It is a RequestException so callers report it like any other failed provider call.
+    """
+
+class QueueTimeoutError(requests.RequestException):
+    """Raised when a queued call is not granted a slot within MAX_QUEUE_WAIT seconds."""
+
+class ProviderScheduler:
+    """Grants provider call slots across sessions with start-time fair queuing.
+
+    Each call gets a start tag max(virtual time, session's last finish tag) and a
+    finish tag start + cost / weight; free slots go to the queued call with the
+    smallest finish tag whose session is under its concurrency cap. A session
+    queuing many bulk calls therefore only delays its own later calls, and small
+    interactive calls from other sessions are served ahead of them.
+    """
+
+    def __init__(self, capacity, max_concurrent=MAX_CONCURRENT_PER_SESSION, max_queued=MAX_QUEUED_PER_SESSION, max_wait=MAX_QUEUE_WAIT):
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.virtual_time = 0.0
+        self.running = 0
+        self.queue = []
+        self.sessions = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _session(self, session_id):
+        if session_id not in self.sessions:
+            self.sessions[session_id] = {
+                'last_finish': 0.0,
+                'running': 0,
+                'queued': 0,
+                'granted': 0,
+                'total_wait': 0.0,
+                'max_wait': 0.0,
+                'last_active': time.time()
+            }
+        return self.sessions[session_id]
+
+    def _grant_ready(self):
+        """Hand free slots to the eligible queued calls with the smallest finish tags."""
+        while self.running < self.capacity:
+            eligible = [ticket for ticket in self.queue if self.sessions[ticket['session_id']]['running'] < self.max_concurrent]
+            if not eligible:
+                return
+            ticket = min(eligible, key=lambda ticket: (ticket['finish'], ticket['sequence']))
+            self.queue.remove(ticket)
+            session = self.sessions[ticket['session_id']]
+            session['queued'] -= 1
+            session['running'] += 1
+            self.running += 1
+            self.virtual_time = max(self.virtual_time, ticket['start'])
+            ticket['granted'] = True
+        self._condition.notify_all()
+
+    def acquire(self, session_id, kind='bulk', cost=1.0, is_cancelled=None):
+        """Block until a slot is granted; returns a ticket to pass to release()."""
+        with self._condition:
+            session = self._session(session_id)
+            if session['queued'] >= self.max_queued:
+                raise QueueFullError(f"Too many queued provider calls for this session ({self.max_queued}).")
+
+            start = max(self.virtual_time, session['last_finish'])
+            ticket = {
+                'session_id': session_id,
+                'start': start,
+                'finish': start + cost / WEIGHTS[kind],
+                'sequence': next(self._sequence),
+                'queued_at': time.monotonic(),
+                'granted': False
+            }
+            session['last_finish'] = ticket['finish']
+            session['queued'] += 1
+            session['last_active'] = time.time()
+            self.queue.append(ticket)
+            self._grant_ready()
+
+            while not ticket['granted']:
+                cancelled = is_cancelled is not None and is_cancelled()
+                if cancelled or time.monotonic() - ticket['queued_at'] > self.max_wait:
+                    self.queue.remove(ticket)
+                    session['queued'] -= 1
+                    if cancelled:
+                        raise CancelledError()
+                    raise QueueTimeoutError(f"No provider slot became free within {self.max_wait} seconds.")
+                self._condition.wait(POLL_INTERVAL)
+
+            wait = time.monotonic() - ticket['queued_at']
+            session['granted'] += 1
+            session['total_wait'] += wait
+            session['max_wait'] = max(session['max_wait'], wait)
+            return ticket
+
+    def release(self, ticket):
+        with self._condition:
+            self.sessions[ticket['session_id']]['running'] -= 1
+            self.running -= 1
+            self._grant_ready()
+
+    def run(self, session_id, function, *args, kind='bulk', cost=1.0, is_cancelled=None, **kwargs):
+        """Call function while holding a slot."""
+        ticket = self.acquire(session_id, kind, cost, is_cancelled)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        """Queue depth and wait times per session, dropping sessions idle for an hour."""
+        with self._condition:
+            now = time.time()
+            for session_id, session in list(self.sessions.items()):
+                if not session['running'] and not session['queued'] and now - session['last_active'] > IDLE_SESSION_SECONDS:
+                    del self.sessions[session_id]
+            return {
+                'capacity': self.capacity,
+                'running': self.running,
+                'queued': len(self.queue),
+                'sessions': {
+                    session_id: {
+                        'running': session['running'],
+                        'queued': session['queued'],
+                        'granted': session['granted'],
+                        'average_wait': session['total_wait'] / session['granted'] if session['granted'] else 0.0,
+                        'max_wait': session['max_wait']
+                    }
+                    for session_id, session in self.sessions.items()
+                }
+            }
+
+def get_scheduler(provider):
+    """Process-wide scheduler for one provider's shared quota."""
+    with _schedulers_lock:
+        if provider not in _schedulers:
+            _schedulers[provider] = ProviderScheduler(PROVIDER_CAPACITY[provider])
+        return _schedulers[provider]
@@ -0,0 +1,346 @@
+# script_templates.py
+"""Local C# scaffolds for the Unity script types.
+
+Each scaffold holds the MonoBehaviour boilerplate for its type and marks the
+concept-specific sections as ${section} lines. The model only writes those
+sections; anything it leaves out or gets wrong falls back to a working default,
+so a scaffold is usable on its own when the provider is unavailable.
+"""
+import re
+from string import Template
+
+from unity_scripts import braces_balanced, strip_code_fences, validate_script
+
+IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+SLOT_LINE_PATTERN = re.compile(r"^(\s*)\$\{(\w+)\}\s*$")
+
+PLAYER_TEMPLATE = """using UnityEngine;
+
+[RequireComponent(typeof(Rigidbody2D))]
+public class $class_name : MonoBehaviour
+{
+    [SerializeField] private float moveSpeed = 5f;
+    [SerializeField] private float jumpForce = 7f;
+    [SerializeField] private Transform groundCheck;
+    [SerializeField] private float groundCheckRadius = 0.1f;
+    [SerializeField] private LayerMask groundLayer;
+    ${fields}
+
+    private Rigidbody2D rb;
+    private Vector2 moveInput;
+    private bool isGrounded;
+
+    void Awake()
+    {
+        rb = GetComponent<Rigidbody2D>();
+    }
+
+    void Update()
+    {
+        // WASD and arrow keys through the default Horizontal and Vertical axes
+        moveInput = new Vector2(Input.GetAxisRaw("Horizontal"), Input.GetAxisRaw("Vertical"));
+        isGrounded = groundCheck != null && Physics2D.OverlapCircle(groundCheck.position, groundCheckRadius, groundLayer);
+
+        if (Input.GetKeyDown(KeyCode.Space))
+        {
+            OnAction();
+        }
+        ${update}
+    }
+
+    void FixedUpdate()
+    {
+        rb.velocity = new Vector2(moveInput.x * moveSpeed, rb.velocity.y);
+    }
+
+    // Space bar: jump or shoot
+    void OnAction()
+    {
+        ${on_action}
+    }
+
+    void OnCollisionEnter2D(Collision2D collision)
+    {
+        ${on_collision}
+    }
+}
+"""
+
+ENEMY_TEMPLATE = """using UnityEngine;
+
+[RequireComponent(typeof(Rigidbody2D))]
+public class $class_name : MonoBehaviour
+{
+    private enum State { Patrol, Chase }
+
+    [SerializeField] private float moveSpeed = 2f;
+    [SerializeField] private float detectionRange = 5f;
+    [SerializeField] private Transform[] patrolPoints;
+    ${fields}
+
+    private Rigidbody2D rb;
+    private Transform player;
+    private State state = State.Patrol;
+    private int patrolIndex;
+
+    void Awake()
+    {
+        rb = GetComponent<Rigidbody2D>();
+        GameObject playerObject = GameObject.FindGameObjectWithTag("Player");
+        if (playerObject != null)
+        {
+            player = playerObject.transform;
+        }
+    }
+
+    void Update()
+    {
+        bool playerInRange = player != null && Vector2.Distance(transform.position, player.position) <= detectionRange;
+        state = playerInRange ? State.Chase : State.Patrol;
+        ${update}
+    }
+
+    void FixedUpdate()
+    {
+        if (state == State.Chase)
+        {
+            Chase();
+        }
+        else
+        {
+            Patrol();
+        }
+    }
+
+    void Patrol()
+    {
+        ${patrol}
+    }
+
+    void Chase()
+    {
+        ${chase}
+    }
+
+    void OnCollisionEnter2D(Collision2D collision)
+    {
+        ${on_collision}
+    }
+
+    void MoveTowards(Vector2 target)
+    {
+        Vector2 direction = (target - (Vector2)transform.position).normalized;
+        rb.velocity = new Vector2(direction.x * moveSpeed, rb.velocity.y);
+    }
+}
+"""
+
+GAME_OBJECT_TEMPLATE = """using UnityEngine;
+
+[RequireComponent(typeof(Collider2D))]
+public class $class_name : MonoBehaviour
+{
+    ${fields}
+
+    void Start()
+    {
+        ${start}
+    }
+
+    void Update()
+    {
+        ${update}
+    }
+
+    void OnTriggerEnter2D(Collider2D other)
+    {
+        if (other.CompareTag("Player"))
+        {
+            OnPlayerContact(other.gameObject);
+        }
+    }
+
+    void OnPlayerContact(GameObject player)
+    {
+        ${on_player_contact}
+    }
+}
+"""
+
+LEVEL_BACKGROUND_TEMPLATE = """using UnityEngine;
+
+public class $class_name : MonoBehaviour
+{
+    [System.Serializable]
+    public class ParallaxLayer
+    {
+        public Transform layer;
+        [Range(0f, 1f)] public float parallaxFactor = 0.5f;
+    }
+
+    [SerializeField] private ParallaxLayer[] layers = new ParallaxLayer[0];
+    [SerializeField] private Transform cameraTransform;
+    ${fields}
+
+    private Vector3 lastCameraPosition;
+
+    void Start()
+    {
+        if (cameraTransform == null && Camera.main != null)
+        {
+            cameraTransform = Camera.main.transform;
+        }
+        if (cameraTransform != null)
+        {
+            lastCameraPosition = cameraTransform.position;
+        }
+        ${start}
+    }
+
+    void LateUpdate()
+    {
+        if (cameraTransform == null)
+        {
+            return;
+        }
+        Vector3 delta = cameraTransform.position - lastCameraPosition;
+        foreach (ParallaxLayer parallaxLayer in layers)
+        {
+            if (parallaxLayer.layer != null)
+            {
+                parallaxLayer.layer.position += new Vector3(delta.x * parallaxLayer.parallaxFactor, delta.y * parallaxLayer.parallaxFactor, 0f);
+            }
+        }
+        lastCameraPosition = cameraTransform.position;
+        ${update}
+    }
+}
+"""
+
+FIELDS_SLOT = ("Extra serialized fields and private state the other sections need, one declaration per line.", "")
+
+# Per script type: the scaffold, the default class name and {section: (description, default code)}
+SCAFFOLDS = {
+    'Player': {
+        'template': PLAYER_TEMPLATE,
+        'class_name': "PlayerController",
+        'slots': {
+            'fields': FIELDS_SLOT,
+            'update': ("Concept-specific per-frame logic at the end of Update(), e.g. abilities on other keys.", ""),
+            'on_action': (
+                "Body of OnAction(), called when Space is pressed: jump (using isGrounded and jumpForce) or shoot.",
+                "if (isGrounded)\n{\n    rb.velocity = new Vector2(rb.velocity.x, jumpForce);\n}"
+            ),
+            'on_collision': ("Body of OnCollisionEnter2D(Collision2D collision), e.g. taking damage or collecting items.", "")
+        }
+    },
+    'Enemy': {
+        'template': ENEMY_TEMPLATE,
+        'class_name': "EnemyController",
+        'slots': {
+            'fields': FIELDS_SLOT,
+            'update': ("Concept-specific per-frame logic at the end of Update(), after state is chosen.", ""),
+            'patrol': (
+                "Body of Patrol(), called from FixedUpdate() while the player is out of range.",
+                "if (patrolPoints == null || patrolPoints.Length == 0)\n{\n    rb.velocity = new Vector2(0f, rb.velocity.y);\n    return;\n}\n"
+                "Vector2 target = patrolPoints[patrolIndex].position;\nMoveTowards(target);\n"
+                "if (Vector2.Distance(transform.position, target) < 0.2f)\n{\n    patrolIndex = (patrolIndex + 1) % patrolPoints.Length;\n}"
+            ),
+            'chase': ("Body of Chase(), called from FixedUpdate() while the player is in range; player is not null here.", "MoveTowards(player.position);"),
+            'on_collision': ("Body of OnCollisionEnter2D(Collision2D collision), e.g. damaging the player.", "")
+        }
+    },
+    'Game Object': {
+        'template': GAME_OBJECT_TEMPLATE,
+        'class_name': "GameObjectBehaviour",
+        'slots': {
+            'fields': FIELDS_SLOT,
+            'start': ("Body of Start().", ""),
+            'update': ("Body of Update(), e.g. bobbing, rotating or timed behaviour.", ""),
+            'on_player_contact': ("Body of OnPlayerContact(GameObject player), called when the player touches the object.", "Destroy(gameObject);")
+        }
+    },
+    'Level Background': {
+        'template': LEVEL_BACKGROUND_TEMPLATE,
+        'class_name': "LevelBackground",
+        'slots': {
+            'fields': FIELDS_SLOT,
+            'start': ("Concept-specific set-up at the end of Start().", ""),
+            'update': ("Concept-specific per-frame effects at the end of LateUpdate(), after the parallax step.", "")
+        }
+    }
+}
+
+def scaffold_schema(script_type):
+    """Strict JSON schema for the class name and the sections of one scaffold."""
+    slots = SCAFFOLDS[script_type]['slots']
+    properties = {'class_name': {"type": "string", "description": "PascalCase name of the MonoBehaviour class."}}
+    properties.update({name: {"type": "string", "description": description} for name, (description, _) in slots.items()})
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+def scaffold_prompt(script_type, description):
+    """Prompt asking only for the concept-specific sections of a scaffold."""
+    slots = SCAFFOLDS[script_type]['slots']
+    sections = "\n".join(f"- {name}: {slot_description}" for name, (slot_description, _) in slots.items())
+    return (
+        f"{description}\n\n"
+        "The script is built from the Unity C# scaffold below. Do not write the whole file: return only a class name and "
+        "the code for each ${section} placeholder, without markdown fences. Sections are inserted as-is at the placeholder, "
+        "must have balanced braces and may only use members declared in the scaffold or in your fields section. "
+        "Use an empty string for a section that needs no extra code.\n\n"
+        f"Sections:\n{sections}\n\nScaffold:\n{SCAFFOLDS[script_type]['template']}"
+    )
+
+def indent_section(code, indent):
+    return "\n".join(indent + line if line.strip() else "" for line in code.splitlines())
+
+def render_scaffold(script_type, class_name, sections):
+    """Substitute the class name and indent each section to its placeholder; empty sections drop their line.
+
+    Sections are inserted after substitution, so the model's code is kept verbatim.
+    """
+    lines = []
+    for line in SCAFFOLDS[script_type]['template'].splitlines():
+        match = SLOT_LINE_PATTERN.match(line)
+        if match is None:
+            lines.append(Template(line).safe_substitute(class_name=class_name))
+        elif sections[match.group(2)].strip():
+            lines.append(indent_section(sections[match.group(2)], match.group(1)))
+    return "\n".join(lines) + "\n"
+
+def unique_class_name(candidate, fallback, taken):
+    """A valid class name not in taken: the candidate if possible, else fallback with a numeric suffix if needed."""
+    if isinstance(candidate, str) and IDENTIFIER_PATTERN.match(candidate.strip()) and candidate.strip() not in taken:
+        return candidate.strip()
+    name, suffix = fallback, 2
+    while name in taken:
+        name, suffix = f"{fallback}{suffix}", suffix + 1
+    return name
+
+def fill_scaffold(script_type, sections=None, taken=(), note=None):
+    """Build a script from its scaffold and the model's sections.
+
+    Missing or malformed sections (unbalanced braces) keep their default code, so
+    fill_scaffold(script_type) alone gives a working scaffold-only script. note is
+    added as a comment at the top of the file.
+    """
+    sections = sections if isinstance(sections, dict) else {}
+    scaffold = SCAFFOLDS[script_type]
+    values = {}
+    for name, (_, default) in scaffold['slots'].items():
+        section = sections.get(name)
+        section = strip_code_fences(section) if isinstance(section, str) else None
+        values[name] = section if section is not None and braces_balanced(section) else default
+
+    name = unique_class_name(sections.get('class_name'), scaffold['class_name'], set(taken))
+    code = render_scaffold(script_type, name, values)
+    if validate_script(code) is not None:
+        code = render_scaffold(script_type, name, {slot: default for slot, (_, default) in scaffold['slots'].items()})
+    if note:
+        code = f"// {note}\n{code}"
+    return code
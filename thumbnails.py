@@ -0,0 +1,69 @@
+# thumbnails.py
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, features
+
+THUMBNAIL_EDGE = 384
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_WORKERS = 4
+THUMBNAIL_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+THUMBNAIL_MEDIA_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+
+def make_thumbnail(path, max_edge=THUMBNAIL_EDGE, image_format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY):
+    """Downscale an image file so its longest edge is at most max_edge and return the encoded bytes."""
+    with Image.open(path) as image:
+        target = (max_edge, max_edge)
+        # JPEG sources can be decoded directly at 1/2, 1/4 or 1/8 scale
+        if image.format == "JPEG":
+            image.draft("RGB", target)
+
+        # Integer box reduction is much cheaper than resampling the full image
+        factor = min(image.width // max_edge, image.height // max_edge)
+        if factor >= 2:
+            image = image.reduce(factor)
+        else:
+            image.load()
+        image.thumbnail(target, Image.Resampling.LANCZOS)
+
+        if image_format == "JPEG" or image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB" if image_format == "JPEG" else "RGBA")
+        buffer = BytesIO()
+        image.save(buffer, format=image_format, quality=quality)
+        return buffer.getvalue()
+
+def try_make_thumbnail(path, max_edge=THUMBNAIL_EDGE):
+    """make_thumbnail that returns None for files Pillow cannot read."""
+    try:
+        return make_thumbnail(path, max_edge)
+    except (OSError, ValueError):
+        return None
+
+def thumbnail_name(ref, max_edge=THUMBNAIL_EDGE):
+    return f"thumbnail:{THUMBNAIL_FORMAT}:{max_edge}:{ref}"
+
+def ensure_thumbnails(store, refs, max_edge=THUMBNAIL_EDGE, max_workers=THUMBNAIL_WORKERS):
+    """Return {ref: thumbnail_ref}, generating the missing thumbnails in a worker pool.
+
+    Thumbnails are stored once per original, so every later render is a lookup.
+    """
+    thumbnails = {}
+    missing = []
+    for ref in refs:
+        thumbnail_ref = store.get_name(thumbnail_name(ref, max_edge))
+        if thumbnail_ref:
+            thumbnails[ref] = thumbnail_ref
+        else:
+            missing.append(ref)
+
+    if missing:
+        # Pillow releases the GIL while decoding and resampling, so threads scale here
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+            results = executor.map(lambda ref: try_make_thumbnail(store.path(ref), max_edge), missing)
+            for ref, data in zip(missing, results):
+                if data is None:
+                    continue
+                thumbnail_ref = store.put_bytes(data, "thumbnail", THUMBNAIL_MEDIA_TYPES[THUMBNAIL_FORMAT])
+                store.set_name(thumbnail_name(ref, max_edge), thumbnail_ref)
+                thumbnails[ref] = thumbnail_ref
+    return thumbnails
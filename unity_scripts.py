@@ -0,0 +1,99 @@
+# unity_scripts.py
+import re
+
+FILE_MARKER = "// ===== FILE {index} ====="
+END_MARKER = "// ===== END FILE ====="
+FILE_MARKER_PATTERN = re.compile(r"^\s*//\s*=+\s*FILE\s+(\d+)\s*=+\s*$", re.MULTILINE)
+END_MARKER_PATTERN = re.compile(r"^\s*//\s*=+\s*END FILE\s*=+\s*$", re.MULTILINE)
+CLASS_PATTERN = re.compile(r"\bclass\s+([A-Za-z_]\w*)")
+FENCE_PATTERN = re.compile(r"^\s*```[\w#+-]*\s*$", re.MULTILINE)
+
+def batch_script_prompt(description, count):
+    """Build a prompt asking for several scripts of one type in a single response."""
+    return (
+        f"{description}\n\n"
+        f"Write {count} different, complete Unity C# scripts for this, each defining its own uniquely named MonoBehaviour class. "
+        f"Start script number N with the line `{FILE_MARKER.format(index='N')}` and end it with the line `{END_MARKER}`, "
+        f"numbering the scripts from 1 to {count}. Output only the scripts, without explanations or markdown fences."
+    )
+
+def strip_code_fences(code):
+    """Remove markdown code fences the model may wrap around C# code."""
+    return FENCE_PATTERN.sub("", code).strip()
+
+def split_script_batch(response_text, count):
+    """Split a batched response into a {index: code} dict for indexes 1..count."""
+    scripts = {}
+    markers = list(FILE_MARKER_PATTERN.finditer(response_text))
+    for position, marker in enumerate(markers):
+        index = int(marker.group(1))
+        if index < 1 or index > count or index in scripts:
+            continue
+        end = markers[position + 1].start() if position + 1 < len(markers) else len(response_text)
+        body = response_text[marker.end():end]
+        end_marker = END_MARKER_PATTERN.search(body)
+        if end_marker:
+            body = body[:end_marker.start()]
+        scripts[index] = strip_code_fences(body)
+    return scripts
+
+def braces_balanced(code):
+    """Check that braces are balanced, ignoring comments, strings and char literals."""
+    depth = 0
+    i = 0
+    length = len(code)
+    while i < length:
+        char = code[i]
+        if code.startswith("//", i):
+            newline = code.find("\n", i)
+            i = length if newline == -1 else newline
+            continue
+        if code.startswith("/*", i):
+            close = code.find("*/", i + 2)
+            if close == -1:
+                return False
+            i = close + 2
+            continue
+        if char == '@' and code.startswith('@"', i):
+            # Verbatim string: quotes are escaped by doubling them
+            i += 2
+            while i < length:
+                if code[i] == '"':
+                    if code.startswith('""', i):
+                        i += 2
+                        continue
+                    break
+                i += 1
+            i += 1
+            continue
+        if char in ('"', "'"):
+            i += 1
+            while i < length and code[i] != char:
+                i += 2 if code[i] == '\\' else 1
+            i += 1
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth < 0:
+                return False
+        i += 1
+    return depth == 0
+
+def script_class_name(code):
+    """Return the first class name declared in the script, or None."""
+    match = CLASS_PATTERN.search(code)
+    return match.group(1) if match else None
+
+def validate_script(code):
+    """Return an error message for an unusable script, or None if it looks valid."""
+    if not isinstance(code, str) or not code.strip():
+        return "empty script"
+    if code.startswith("Error:"):
+        return code
+    if script_class_name(code) is None:
+        return "no class declaration"
+    if not braces_balanced(code):
+        return "unbalanced braces"
+    return None
@@ -0,0 +1,22 @@
+# worker_pool.py
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+MAX_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+
+def pool_context():
+    """Start workers from a clean process; forking the threaded Streamlit server can deadlock them."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+def map_in_processes(function, items, max_workers=MAX_WORKERS):
+    """Map a module-level function over items in a process pool, in order.
+
+    Single items run inline, since starting a pool costs more than it saves.
+    """
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [function(item) for item in items]
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(items)), mp_context=pool_context()) as executor:
+        return list(executor.map(function, items))